@@ -4,7 +4,24 @@
 import os
 import json
 import math
+import heapq
+import pickle
+import hashlib
+import mmap
+import multiprocessing
 import xml.etree.ElementTree as ET
+from array import array
+from bisect import bisect_left, bisect_right
+
+try:  # optional: libxml2-backed parser for the (large) FCD output
+    from lxml import etree as _lxml_etree
+except ImportError:
+    _lxml_etree = None
+
+try:  # optional: faster JSON encoder for the output file
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
 
 
 # ---------- Helpers ----------
@@ -24,10 +41,19 @@ def _extract_edge_and_index(station_id):
     if not station_id.startswith("cs_"):
         raise ValueError("Invalid charging station ID: " + station_id)
     body = station_id[3:]  # strip 'cs_'
-    parts = body.split("_")
-    if len(parts) < 2:
+    sep = body.rfind("_")  # the index is after the last underscore
+    if sep < 0:
         raise ValueError("Invalid charging station ID: " + station_id)
-    return "_".join(parts[:-1]), parts[-1]
+    return body[:sep], body[sep + 1:]
+
+
+def _station_edges(station_ids):
+    """Map each station ID to its ('<edge_id>', '<i>') parts."""
+    station_edges = {}
+    for sid in station_ids:
+        if sid not in station_edges:
+            station_edges[sid] = _extract_edge_and_index(sid)
+    return station_edges
 
 
 def _parse_sumocfg(config_path):
@@ -63,6 +89,37 @@ def _parse_sumocfg(config_path):
 
 # ---------- Charging events ----------
 
+class _ChargingEventCollector:
+    """
+    Parser target collecting the <chargingEvent> children of the root into
+    columns (station ids, vehicle ids and begin/end/energy arrays), without
+    building Element objects or aggregating anything per event.
+    """
+
+    def __init__(self):
+        self.station_ids = []
+        self.vehicle_ids = []
+        self.begins = array("d")
+        self.ends = array("d")
+        self.energies = array("d")
+        self.depth = 0
+
+    def start(self, tag, attrib):
+        self.depth += 1
+        if self.depth == 2 and tag == "chargingEvent":
+            self.station_ids.append(attrib.get("chargingStationId"))
+            self.vehicle_ids.append(attrib.get("vehicle"))
+            self.energies.append(float(attrib.get("totalEnergyChargedIntoVehicle")))
+            self.begins.append(float(attrib.get("chargingBegin")))
+            self.ends.append(float(attrib.get("chargingEnd")))
+
+    def end(self, tag):
+        self.depth -= 1
+
+    def close(self):
+        return self
+
+
 def _load_charging_events(charging_xml_path):
     """
     Read chargingStationStats.xml and return:
@@ -70,25 +127,19 @@ def _load_charging_events(charging_xml_path):
       - station_metrics (initialized per station)
       - vehicles_of_interest: set of vehicle IDs
     """
-    cs_tree = ET.parse(charging_xml_path)
-    cs_root = cs_tree.getroot()
-
-    events = []
-    station_metrics = {}
-    vehicles_of_interest = set()
+    collector = _parse_with_target(charging_xml_path, _ChargingEventCollector())
 
-    for ev in cs_root.findall("chargingEvent"):
-        station_id = ev.get("chargingStationId")
-        veh = ev.get("vehicle")
-        energy = float(ev.get("totalEnergyChargedIntoVehicle"))
-        t_begin = float(ev.get("chargingBegin"))
-        t_end = float(ev.get("chargingEnd"))
+    station_ids = collector.station_ids
+    vehicle_ids = collector.vehicle_ids
+    events = list(zip(station_ids, vehicle_ids, collector.begins, collector.ends, collector.energies))
+    vehicles_of_interest = set(vehicle_ids)
 
-        events.append((station_id, veh, t_begin, t_end, energy))
-        vehicles_of_interest.add(veh)
-
-        if station_id not in station_metrics:
-            station_metrics[station_id] = {
+    # Per-station totals, aggregated once over the columns (stations in order of first event)
+    station_metrics = {}
+    for station_id, veh, t_begin, t_end, energy in events:
+        s = station_metrics.get(station_id)
+        if s is None:
+            s = station_metrics[station_id] = {
                 "total_energy_charged": 0.0,
                 "total_charging_time": 0.0,
                 "number_of_sessions": 0,
@@ -99,107 +150,273 @@ def _load_charging_events(charging_xml_path):
                 "avg_session_wait_time": 0.0,
                 "p95_session_wait_time": 0.0
             }
-
-        s = station_metrics[station_id]
         s["total_energy_charged"] += energy
         s["total_charging_time"] += (t_end - t_begin)
-        s["number_of_sessions"] += 1
         s["vehicles"].append(veh)
+    for s in station_metrics.values():
+        s["number_of_sessions"] = len(s["vehicles"])
 
     return events, station_metrics, vehicles_of_interest
 
 
 # ---------- FCD parsing ----------
 
-def _build_fcd_series_and_lane_zero_counts(fcd_xml_path, vehicles_filter=None):
+# Files smaller than this are parsed in-process (worker start-up would dominate).
+_FCD_PARALLEL_MIN_BYTES = 32 * 1024 * 1024
+_FCD_READ_BLOCK = 1024 * 1024
+_FCD_CHUNKS_PER_WORKER = 4
+
+
+# lane_table entry of lanes outside every queue zone
+_NO_LANE_INFO = (None, False)
+
+
+class _FcdCollector:
     """
-    Build:
-      - per-vehicle time series: veh_id -> list[(time, lane)]
-      - lane->time->count_zero_speed: dict of per-time counts of vehicles with speed==0
-    Uses iterparse to be memory-friendly.
-    Only vehicles in vehicles_filter are considered for per-vehicle series,
-    but for queue counts we also restrict to vehicles_filter to stay consistent
-    with the population that actually usa CS (y reducir memoria).
+    Parser target collecting the per-vehicle zone runs and the lane zero-speed
+    counts of an FCD document.
+    The parser hands start() the tag and attributes of each element, so no
+    Element objects are built (or cleared) and there are no end events to dispatch.
+    lane_table maps the lanes of interest to (zone code, count zeros): the int
+    code of the station group whose queue zone the lane belongs to (or None),
+    and whether zero speeds are counted (and speeds parsed) on it, which is only
+    done on the station lanes. One dict lookup per sample covers both.
+    A vehicle's zone runs are [(zone code or None, start time), ...]: a new run starts
+    every time the vehicle moves into another zone (or out of all zones), so only
+    zone changes are kept instead of one sample per timestep.
     """
-    series = {}
-    lane_zero_counts = {}  # lane -> {time -> count_of_veh_speed0}
-
-    context = ET.iterparse(fcd_xml_path, events=("start", "end"))
-    _, root = next(context)
-    current_time = None
-
-    for event, elem in context:
-        tag = elem.tag
-
-        if event == "start" and tag == "timestep":
-            current_time = float(elem.get("time", "0"))
-
-        elif event == "end" and tag == "vehicle":
-            vid = elem.get("id")
-            lane = elem.get("lane")
-            # speed might be absent for stopped or 0; SUMO writes "speed"
-            speed_str = elem.get("speed")
-            try:
-                speed = float(speed_str) if speed_str is not None else 0.0
-            except ValueError:
-                speed = 0.0
-
-            if vehicles_filter is None or vid in vehicles_filter:
-                # Save series for waits
+
+    def __init__(self, vehicles_filter, lane_table):
+        self.vehicles_filter = vehicles_filter
+        self.lane_table = lane_table
+        self.zone_runs = {}  # veh_id -> [(zone code or None, start time), ...]
+        self.lane_zero_counts = {}  # lane -> {time -> count_of_veh_speed0}
+        self.current_time = None
+
+    def start(self, tag, attrib):
+        if tag == "vehicle":
+            current_time = self.current_time
+            vid = attrib.get("id")
+            lane = attrib.get("lane")
+
+            if self.vehicles_filter is None or vid in self.vehicles_filter:
+                zone, count_zeros = self.lane_table.get(lane, _NO_LANE_INFO)
+                # Track zone changes for waits
                 if vid and lane is not None and current_time is not None:
-                    series.setdefault(vid, []).append((current_time, lane))
+                    runs = self.zone_runs.get(vid)
+                    if runs is None:
+                        self.zone_runs[vid] = [(zone, current_time)]
+                    elif runs[-1][0] != zone:
+                        runs.append((zone, current_time))
                 # Count queue zeros (restrict to vehicles_filter for coherency)
-                if lane is not None and current_time is not None and speed == 0.0:
-                    lane_zero_counts.setdefault(lane, {})
-                    lane_zero_counts[lane][current_time] = lane_zero_counts[lane].get(current_time, 0) + 1
+                if count_zeros and current_time is not None:
+                    # speed might be absent for stopped or 0; SUMO writes "speed"
+                    speed_str = attrib.get("speed")
+                    try:
+                        speed = float(speed_str) if speed_str is not None else 0.0
+                    except ValueError:
+                        speed = 0.0
+                    if speed == 0.0:
+                        lane_counts = self.lane_zero_counts.setdefault(lane, {})
+                        lane_counts[current_time] = lane_counts.get(current_time, 0) + 1
 
-            elem.clear()
+        elif tag == "timestep":
+            self.current_time = float(attrib.get("time", "0"))
 
-        elif event == "end" and tag == "timestep":
-            root.clear()
+    def close(self):
+        return self.zone_runs, self.lane_zero_counts
 
-    # sort per-vehicle series by time
-    for vid in series:
-        series[vid].sort(key=lambda x: x[0])
 
-    return series, lane_zero_counts
+def _fcd_timestep_chunks(fcd_xml_path, n_chunks):
+    """
+    Split the FCD file into at most n_chunks byte ranges [start, end),
+    each starting at a '<timestep ' marker, so every range holds whole timesteps.
+    """
+    if os.path.getsize(fcd_xml_path) == 0:
+        return []
+    with open(fcd_xml_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        first = mm.find(b"<timestep ")
+        if first < 0:
+            return []
+        end = mm.rfind(b"</fcd-export>")
+        if end < first:
+            end = len(mm)
+
+        bounds = [first]
+        step = (end - first) // n_chunks
+        for k in range(1, n_chunks):
+            pos = mm.find(b"<timestep ", first + k * step, end)
+            if pos < 0:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+        bounds.append(end)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _parse_with_target(xml_path, collector, start=0, end=None):
+    """
+    Feed an XML file to a parser with collector as target and return its result.
+    With end, only the byte range [start, end) of an FCD file is parsed, wrapped
+    in a synthetic <fcd-export> root.
+    """
+    if _lxml_etree is not None:
+        parser = _lxml_etree.XMLParser(target=collector, huge_tree=True)
+    else:
+        parser = ET.XMLParser(target=collector)
+    if end is not None:
+        parser.feed(b"<fcd-export>")
+    with open(xml_path, "rb") as f:
+        f.seek(start)
+        remaining = end - start if end is not None else None
+        while remaining is None or remaining > 0:
+            block = f.read(_FCD_READ_BLOCK if remaining is None else min(_FCD_READ_BLOCK, remaining))
+            if not block:
+                break
+            if remaining is not None:
+                remaining -= len(block)
+            parser.feed(block)
+    if end is not None:
+        parser.feed(b"</fcd-export>")
+    return parser.close()
 
 
-# ---------- Waits (from queue entry) ----------
+# Filters shared by every chunk of a parallel parse, set once per worker process
+_fcd_worker_filters = None
 
-def _find_queue_entry_time(samples, in_zone, t_end):
-    """Find first time vehicle is in queue zone before t_end."""
-    if not samples:
-        return None
 
-    lo, hi = 0, len(samples) - 1
-    last_idx = -1
-    while lo <= hi:
-        mid = (lo + hi) // 2
-        if samples[mid][0] <= t_end:
-            last_idx = mid
-            lo = mid + 1
-        else:
-            hi = mid - 1
-    if last_idx == -1:
-        return None
+def _init_fcd_worker(vehicles_filter, lane_table):
+    global _fcd_worker_filters
+    _fcd_worker_filters = (vehicles_filter, lane_table)
+
+
+def _parse_fcd_chunk(args):
+    """Worker: parse one timestep-aligned byte range of the FCD file."""
+    fcd_xml_path, start, end = args
+    vehicles_filter, lane_table = _fcd_worker_filters
+    return _parse_with_target(fcd_xml_path, _FcdCollector(vehicles_filter, lane_table), start, end)
+
+
+def _build_fcd_zone_runs_and_lane_zero_counts(fcd_xml_path, lane_table, vehicles_filter=None, n_workers=None, cache_dir=None):
+    """
+    Build in one streaming pass:
+      - per-vehicle zone runs: veh_id -> [(zone code or None, start time), ...] (see _FcdCollector)
+      - lane->time->count_zero_speed: dict of per-time counts of vehicles with speed==0,
+        for the station lanes only (the only lanes queues are measured on)
+    Streams the file through a parser target to be memory-friendly; FCD timesteps are written in time order.
+    Only vehicles in vehicles_filter are considered for zone runs,
+    but for queue counts we also restrict to vehicles_filter to stay consistent
+    with the population that actually usa CS (y reducir memoria).
+
+    Large files are split at <timestep> boundaries and parsed by n_workers
+    processes (default: one per CPU); partial results are merged in file order.
 
-    i = last_idx
-    if in_zone(samples[i][1]):
-        entry_time = samples[i][0]
-        while i - 1 >= 0 and in_zone(samples[i - 1][1]):
-            i -= 1
-            entry_time = samples[i][0]
-        return entry_time
+    With cache_dir, the result is also pickled there, keyed by the FCD file
+    (path, mtime, size) and the lane table / vehicle filter, and reused instead
+    of parsing again while the file is unchanged.
+    """
+    if cache_dir is not None:
+        cache_path = _fcd_cache_path(cache_dir, fcd_xml_path, lane_table, vehicles_filter)
+        try:
+            with open(cache_path, "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    # Daemonic processes (e.g. multiprocessing.Pool workers) cannot spawn children
+    if multiprocessing.current_process().daemon or os.path.getsize(fcd_xml_path) < _FCD_PARALLEL_MIN_BYTES:
+        n_workers = 1
+
+    # Several chunks per worker, so a worker that finishes early picks up more work
+    chunks = _fcd_timestep_chunks(fcd_xml_path, n_workers * _FCD_CHUNKS_PER_WORKER) if n_workers > 1 else []
+    if len(chunks) > 1:
+        zone_runs = {}
+        lane_zero_counts = {}
+        tasks = [(fcd_xml_path, start, end) for start, end in chunks]
+        with multiprocessing.Pool(min(n_workers, len(chunks)), initializer=_init_fcd_worker,
+                                  initargs=(vehicles_filter, lane_table)) as pool:
+            for part_runs, part_counts in pool.imap(_parse_fcd_chunk, tasks):
+                for vid, runs in part_runs.items():
+                    merged = zone_runs.get(vid)
+                    if merged is None:
+                        zone_runs[vid] = runs
+                    elif merged[-1][0] == runs[0][0]:
+                        # Same zone across the chunk boundary: the earlier run continues
+                        merged.extend(runs[1:])
+                    else:
+                        merged.extend(runs)
+                for lane, counts in part_counts.items():
+                    lane_counts = lane_zero_counts.setdefault(lane, {})
+                    for tt, cnt in counts.items():
+                        lane_counts[tt] = lane_counts.get(tt, 0) + cnt
     else:
-        while i - 1 >= 0:
-            if in_zone(samples[i][1]) and not in_zone(samples[i - 1][1]):
-                return samples[i][0]
-            i -= 1
+        zone_runs, lane_zero_counts = _parse_with_target(fcd_xml_path, _FcdCollector(vehicles_filter, lane_table))
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write then rename, so a concurrent reader never sees a partial file
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump((zone_runs, lane_zero_counts), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+
+    return zone_runs, lane_zero_counts
+
+
+def _fcd_cache_path(cache_dir, fcd_xml_path, lane_table, vehicles_filter):
+    """Cache file for the parse of fcd_xml_path with the given lane table and vehicle filter."""
+    st = os.stat(fcd_xml_path)
+    key = hashlib.blake2b(digest_size=16)
+    key.update(f"{os.path.abspath(fcd_xml_path)}:{st.st_mtime_ns}:{st.st_size}".encode())
+    key.update(repr(sorted(lane_table.items())).encode())
+    key.update(repr(sorted(vehicles_filter) if vehicles_filter is not None else None).encode())
+    return os.path.join(cache_dir, f"fcd_{key.hexdigest()}.pickle")
+
+
+# ---------- Waits (from queue entry) ----------
+
+def _zone_visits(runs):
+    """
+    From a vehicle's zone runs return zone code -> (starts, exits) as array('d')
+    columns (bisect works on them directly): its visits
+    to each zone, where exit is the time of the first sample after the visit
+    (inf if the vehicle never leaves).
+    """
+    visits = {}
+    for k, (zone, start) in enumerate(runs):
+        if zone is not None:
+            starts, exits = visits.setdefault(zone, (array("d"), array("d")))
+            starts.append(start)
+            exits.append(runs[k + 1][1] if k + 1 < len(runs) else math.inf)
+    return visits
+
+
+def _find_queue_entry_time(starts, exits, first_time, t_end):
+    """
+    Find first time vehicle is in queue zone before t_end.
+    starts/exits: the vehicle's visits to the zone (see _zone_visits),
+    first_time: time of the vehicle's first sample.
+    """
+    # Vehicles usually charge right after their latest zone visit starts:
+    # check that visit first and only bisect the earlier ones otherwise
+    j = len(starts) - 1
+    if t_end < starts[j]:
+        j = bisect_right(starts, t_end, 0, j) - 1
+    if j < 0:
+        return None
+    if t_end < exits[j]:
+        # The last sample at or before t_end is inside this visit
+        return starts[j]
+    if starts[j] == first_time:
+        # A past visit only counts as an entry if the vehicle came from outside the zone
         return None
+    return starts[j]
 
 
-def _compute_session_waits_and_queues(events, fcd_xml_path, effective_cs_count_by_edge):
+def _compute_session_waits_and_queues(events, fcd_xml_path, effective_cs_count_by_edge, n_workers=None, station_edges=None,
+                                      cache_dir=None):
     """
     Compute:
       - per-station waits: from queue entry (to_cs_<edge>_0 or cs_lanes_<edge>_k) to charging begin
@@ -207,40 +424,60 @@ def _compute_session_waits_and_queues(events, fcd_xml_path, effective_cs_count_b
         in the *station lane* (cs_lanes_<edge>_<i>) during [chargingBegin, chargingEnd].
     """
     vehicles = set(ev[1] for ev in events)
-    series, lane_zero_counts = _build_fcd_series_and_lane_zero_counts(fcd_xml_path, vehicles_filter=vehicles)
+
+    # Group edge and station lane of every station, derived once per station instead of per event
+    if station_edges is None:
+        station_edges = _station_edges(ev[0] for ev in events)
+    stations = {}
+    for ev in events:
+        if ev[0] not in stations:
+            edge_id, idx = station_edges[ev[0]]
+            stations[ev[0]] = (edge_id, f"cs_lanes_{edge_id}_{idx}")
+
+    # Queue zone lanes of every station group, tagged with the group's int zone code
+    # (lane names are unique per edge), plus the station lanes where queues are counted
+    zone_codes = {}
+    lane_table = {}
+    for edge_id in sorted(set(edge_id for edge_id, _ in stations.values())):
+        code = zone_codes[edge_id] = len(zone_codes)
+        n_cs = max(1, effective_cs_count_by_edge.get(edge_id, 1))
+        lane_table[f"to_cs_{edge_id}_0"] = (code, False)
+        for k in range(n_cs):
+            lane_table[f"cs_lanes_{edge_id}_{k}"] = (code, False)
+    for _, station_lane in stations.values():
+        lane_table[station_lane] = (lane_table.get(station_lane, _NO_LANE_INFO)[0], True)
+
+    zone_runs, lane_zero_counts = _build_fcd_zone_runs_and_lane_zero_counts(
+        fcd_xml_path, lane_table, vehicles_filter=vehicles, n_workers=n_workers, cache_dir=cache_dir)
     per_station_waits = {}
     per_station_queues = {}
 
-    for station_id, veh, t_begin, t_end, _ in events:
-        edge_id, idx = _extract_edge_and_index(station_id)
-        n_cs = max(1, effective_cs_count_by_edge.get(edge_id, 1))
+    visits_by_vehicle = {vid: (_zone_visits(runs), runs[0][1]) for vid, runs in zone_runs.items()}
+    no_visits = ({}, None)
+    zero_series = {}  # station lane -> (array('d') sorted times, array('i') zero-speed counts)
 
-        # Queue zone for waits
-        queue_lanes = {f"to_cs_{edge_id}_0"} | {f"cs_lanes_{edge_id}_{k}" for k in range(n_cs)}
-        in_zone = lambda lane_name: lane_name in queue_lanes
-
-        # Compute wait
-        samples = series.get(veh, [])
-        t_enter = _find_queue_entry_time(samples, in_zone, t_begin)
-        if t_enter is not None:
-            wait = max(0.0, t_begin - t_enter)
-            per_station_waits.setdefault(station_id, []).append(wait)
-
-        # Compute queue length (station lane only)
-        station_lane = f"cs_lanes_{edge_id}_{idx}"
-        lane_counts = lane_zero_counts.get(station_lane, {})
-        if lane_counts:
-            # We have discrete times; take max on [t_begin, t_end]
-            qmax = 0
-            # Iterate only keys within interval for efficiency
-            # (simple scan; keys count per lane is typically small)
-            for tt, cnt in lane_counts.items():
-                if t_begin <= tt <= t_end:
-                    if cnt > qmax:
-                        qmax = cnt
-            per_station_queues.setdefault(station_id, []).append(qmax)
-        else:
-            per_station_queues.setdefault(station_id, []).append(0)
+    for station_id, veh, t_begin, t_end, _ in events:
+        edge_id, station_lane = stations[station_id]
+
+        # Compute wait (queue entry from the vehicle's visits to the group's zone)
+        visits, first_time = visits_by_vehicle.get(veh, no_visits)
+        zone_visits = visits.get(zone_codes[edge_id])
+        if zone_visits is not None:
+            t_enter = _find_queue_entry_time(zone_visits[0], zone_visits[1], first_time, t_begin)
+            if t_enter is not None:
+                wait = max(0.0, t_begin - t_enter)
+                per_station_waits.setdefault(station_id, []).append(wait)
+
+        # Compute queue length (station lane only): max on [t_begin, t_end]
+        # of the lane's discrete times, found by bisecting its sorted times
+        lane_series = zero_series.get(station_lane)
+        if lane_series is None:
+            counts = lane_zero_counts.get(station_lane, {})
+            times = sorted(counts)
+            lane_series = zero_series[station_lane] = (array("d", times), array("i", [counts[tt] for tt in times]))
+        times, counts = lane_series
+        qmax = max(counts[bisect_left(times, t_begin):bisect_right(times, t_end)], default=0)
+        per_station_queues.setdefault(station_id, []).append(qmax)
 
     return per_station_waits, per_station_queues
 
@@ -259,15 +496,27 @@ def _percentile_nearest_rank(values, p):
         return min(values)
     if p >= 100:
         return max(values)
-    arr = sorted(values)
-    rank = math.ceil((p / 100.0) * len(arr))
+    n = len(values)
+    rank = math.ceil((p / 100.0) * n)
     idx = max(1, rank) - 1
-    return arr[idx]
+    # Partial selection instead of a full sort: only the values on the short side
+    # of the rank are kept (e.g. the top 5% for p95)
+    if idx >= n // 2:
+        return heapq.nlargest(n - idx, values)[-1]
+    return heapq.nsmallest(idx + 1, values)[-1]
 
 
 # ---------- Aggregation ----------
 
-def _compute_group_and_totals(station_metrics, sim_duration, effective_cs_count_by_edge=None, cs_size=None):
+def _group_sums(values, groups, n_groups):
+    """Sum values by group ordinal (groups[i] is the group of values[i])."""
+    sums = [0] * n_groups
+    for g, v in zip(groups, values):
+        sums[g] += v
+    return sums
+
+
+def _compute_group_and_totals(station_metrics, sim_duration, effective_cs_count_by_edge=None, cs_size=None, station_edges=None):
     """
     Aggregate per_group and totals from station_metrics.
     Adds:
@@ -279,55 +528,77 @@ def _compute_group_and_totals(station_metrics, sim_duration, effective_cs_count_
     Uses:
       - p95_session_wait_time field name (no 'avg_' prefix) for group and totals.
     """
-    # per-station derived metrics
-    for s in station_metrics.values():
-        s["utilization"] = (s["total_charging_time"] / sim_duration) if sim_duration > 0 else 0.0
-        waits = s.get("session_wait_times", [])
-        s["avg_session_wait_time"] = (sum(waits) / len(waits)) if waits else 0.0
-        s["p95_session_wait_time"] = _percentile_nearest_rank(waits, 95) if waits else 0.0
-
-    # group accumulators
-    group_acc = {}
+    if station_edges is None:
+        station_edges = _station_edges(station_metrics)
+
+    # per-station derived metrics (utilization, avg/p95 wait) and the per-station
+    # columns in one pass, with the ordinal of each station's group
+    has_duration = sim_duration > 0
+    group_ids = {}  # edge_id -> group ordinal (in order of first station)
+    station_groups = []
+    energy, charging_time, sessions = [], [], []
+    utilization, waits_avg, waits_p95 = [], [], []
+    group_queues = []  # all queues registered at the stations of each group
+    all_queues = []
     for station_id, s in station_metrics.items():
-        edge_id, _ = _extract_edge_and_index(station_id)
-        g = group_acc.setdefault(edge_id, {
-            "energy": [], "time": [], "sessions": [], "utilization": [],
-            "waits_avg": [], "waits_p95": [], "queues_all": []
-        })
-        g["energy"].append(s["total_energy_charged"])
-        g["time"].append(s["total_charging_time"])
-        g["sessions"].append(s["number_of_sessions"])
-        g["utilization"].append(s["utilization"])
-        g["waits_avg"].append(s["avg_session_wait_time"])
-        g["waits_p95"].append(s["p95_session_wait_time"])
-        # Extiende con todas las colas registradas en la estación
-        g["queues_all"].extend(s.get("queues", []))
+        edge_id, _ = station_edges[station_id]
+        g = group_ids.get(edge_id)
+        if g is None:
+            g = group_ids[edge_id] = len(group_ids)
+            group_queues.append([])
+        station_groups.append(g)
+
+        station_time = s["total_charging_time"]
+        waits = s.get("session_wait_times", [])
+        s["utilization"] = u = (station_time / sim_duration) if has_duration else 0.0
+        s["avg_session_wait_time"] = w_avg = (sum(waits) / len(waits)) if waits else 0.0
+        s["p95_session_wait_time"] = w_p95 = _percentile_nearest_rank(waits, 95) if waits else 0.0
+
+        energy.append(s["total_energy_charged"])
+        charging_time.append(station_time)
+        sessions.append(s["number_of_sessions"])
+        utilization.append(u)
+        waits_avg.append(w_avg)
+        waits_p95.append(w_p95)
+        queues = s.get("queues", [])
+        group_queues[g].extend(queues)
+        all_queues.extend(queues)
+
+    # group-by sums over the columns, one reduction per metric
+    n_groups = len(group_ids)
+    group_used = _group_sums([1] * len(station_groups), station_groups, n_groups)
+    group_energy = _group_sums(energy, station_groups, n_groups)
+    group_time = _group_sums(charging_time, station_groups, n_groups)
+    group_sessions = _group_sums(sessions, station_groups, n_groups)
+    group_utilization = _group_sums(utilization, station_groups, n_groups)
+    group_waits_avg = _group_sums(waits_avg, station_groups, n_groups)
+    group_waits_p95 = _group_sums(waits_p95, station_groups, n_groups)
 
     # build per_group with corrected station counts + queue stats
     per_group = {}
-    for edge_id, acc in group_acc.items():
-        used = len(acc["energy"])  # stations that actually appear in events
+    for edge_id, g in group_ids.items():
+        used = group_used[g]  # stations that actually appear in events
         n = used if used > 0 else 1
 
         # Queue stats (sobre TODAS las sesiones del grupo)
-        queues_all = acc["queues_all"]
+        queues_all = group_queues[g]
         avg_q = (sum(queues_all) / len(queues_all)) if queues_all else 0.0
         p95_q = _percentile_nearest_rank(queues_all, 95) if queues_all else 0.0
 
         group_entry = {
             # Totales solicitados
-            "total_energy_charged": sum(acc["energy"]),
-            "avg_energy_charged": sum(acc["energy"]) / n,
-            "total_charging_time": sum(acc["time"]),
-            "avg_charging_time": sum(acc["time"]) / n,
-            "total_number_of_sessions": sum(acc["sessions"]),
+            "total_energy_charged": group_energy[g],
+            "avg_energy_charged": group_energy[g] / n,
+            "total_charging_time": group_time[g],
+            "avg_charging_time": group_time[g] / n,
+            "total_number_of_sessions": group_sessions[g],
             "avg_queue_length": avg_q,
             "p95_queue_length": p95_q,
 
             # Métricas previas
-            "avg_utilization": sum(acc["utilization"]) / n,
-            "avg_session_wait_time": sum(acc["waits_avg"]) / n,
-            "p95_session_wait_time": sum(acc["waits_p95"]) / n,  # media de p95 por estación
+            "avg_utilization": group_utilization[g] / n,
+            "avg_session_wait_time": group_waits_avg[g] / n,
+            "p95_session_wait_time": group_waits_p95[g] / n,  # media de p95 por estación
             "number_of_stations_used": used
         }
 
@@ -340,30 +611,29 @@ def _compute_group_and_totals(station_metrics, sim_duration, effective_cs_count_
 
     # totals (averages across stations used) + requested totals/queues
     num_stations_used = len(station_metrics)
-    all_queues = []
-    for s in station_metrics.values():
-        all_queues.extend(s.get("queues", []))
+    total_energy = sum(energy)
+    total_time = sum(charging_time)
 
     totals = {
         # Totales solicitados
-        "total_energy_charged": sum(s["total_energy_charged"] for s in station_metrics.values()),
-        "avg_energy_charged": (sum(s["total_energy_charged"] for s in station_metrics.values()) / num_stations_used) if num_stations_used else 0.0,
-        "total_charging_time": sum(s["total_charging_time"] for s in station_metrics.values()),
-        "avg_charging_time": (sum(s["total_charging_time"] for s in station_metrics.values()) / num_stations_used) if num_stations_used else 0.0,
-        "total_number_of_sessions": sum(s["number_of_sessions"] for s in station_metrics.values()),
+        "total_energy_charged": total_energy,
+        "avg_energy_charged": (total_energy / num_stations_used) if num_stations_used else 0.0,
+        "total_charging_time": total_time,
+        "avg_charging_time": (total_time / num_stations_used) if num_stations_used else 0.0,
+        "total_number_of_sessions": sum(sessions),
         "avg_queue_length": (sum(all_queues) / len(all_queues)) if all_queues else 0.0,
         "p95_queue_length": _percentile_nearest_rank(all_queues, 95) if all_queues else 0.0,
 
         # Métricas previas
-        "avg_utilization": (sum(s["utilization"] for s in station_metrics.values()) / num_stations_used) if num_stations_used else 0.0,
-        "avg_session_wait_time": (sum(s["avg_session_wait_time"] for s in station_metrics.values()) / num_stations_used) if num_stations_used else 0.0,
-        "p95_session_wait_time": (sum(s["p95_session_wait_time"] for s in station_metrics.values()) / num_stations_used) if num_stations_used else 0.0,
+        "avg_utilization": (sum(utilization) / num_stations_used) if num_stations_used else 0.0,
+        "avg_session_wait_time": (sum(waits_avg) / num_stations_used) if num_stations_used else 0.0,
+        "p95_session_wait_time": (sum(waits_p95) / num_stations_used) if num_stations_used else 0.0,
         "number_of_stations_used": num_stations_used,
         "simulation_duration": sim_duration
     }
 
     if cs_size is not None:
-        num_groups = len(group_acc)  # distinct edge_ids that appeared
+        num_groups = n_groups  # distinct edge_ids that appeared
         total_planned = int(cs_size) * num_groups
         totals["number_of_stations_total"] = total_planned
         totals["stations_used_ratio"] = (num_stations_used / total_planned) if total_planned else 0.0
@@ -374,20 +644,57 @@ def _compute_group_and_totals(station_metrics, sim_duration, effective_cs_count_
 # ---------- JSON rounding ----------
 
 def _round_floats(obj, decimals=2):
-    """Recursively round floats in nested structures."""
+    """
+    Round floats in nested dicts/lists in place and return obj.
+    Iterative walk: no rebuilt copy of the tree and no recursion per level.
+    """
     if isinstance(obj, float):
         return round(obj, decimals)
-    elif isinstance(obj, list):
-        return [_round_floats(i, decimals) for i in obj]
-    elif isinstance(obj, dict):
-        return {k: _round_floats(v, decimals) for k, v in obj.items()}
+    stack = [obj] if isinstance(obj, (dict, list)) else []
+    while stack:
+        node = stack.pop()
+        for k, v in (node.items() if isinstance(node, dict) else enumerate(node)):
+            if isinstance(v, float):
+                node[k] = round(v, decimals)
+            elif isinstance(v, (dict, list)):
+                stack.append(v)
+    return obj
+
+
+# Float fields of a per_station entry (besides its session_wait_times list)
+_STATION_FLOAT_KEYS = ("total_energy_charged", "total_charging_time", "utilization",
+                       "avg_session_wait_time", "p95_session_wait_time")
+
+
+def _round_charging_metrics(station_metrics, per_group, totals, decimals=2):
+    """
+    Round the floats of the charging metrics in place, visiting the known
+    fields of the fixed output schema instead of walking the whole tree.
+    """
+    for s in station_metrics.values():
+        for key in _STATION_FLOAT_KEYS:
+            s[key] = round(s[key], decimals)
+        s["session_wait_times"] = [round(w, decimals) for w in s["session_wait_times"]]
+    # per_group entries and totals are flat dicts of numbers
+    for entry in list(per_group.values()) + [totals]:
+        for key, value in entry.items():
+            if isinstance(value, float):
+                entry[key] = round(value, decimals)
+
+
+def _write_json(data, output_json_path):
+    """Write data as indented JSON, with orjson's C encoder when available."""
+    if _orjson is not None:
+        with open(output_json_path, "wb") as f:
+            f.write(_orjson.dumps(data, option=_orjson.OPT_INDENT_2))
     else:
-        return obj
+        with open(output_json_path, "w") as f:
+            json.dump(data, f, indent=2)
 
 
 # ---------- Public API ----------
 
-def extract_charging_metrics_from_sumocfg(config_path, output_json_path, cs_size=None):
+def extract_charging_metrics_from_sumocfg(config_path, output_json_path, cs_size=None, n_workers=None, fcd_cache_dir=None):
     """
     Compute charging metrics and write JSON.
 
@@ -408,14 +715,20 @@ def extract_charging_metrics_from_sumocfg(config_path, output_json_path, cs_size
         config_path (str): Path to the SUMO .sumocfg file.
         output_json_path (str): Path to output JSON file.
         cs_size (int|None): Intended number of stations (lanes) per group (optional).
+        n_workers (int|None): Processes used to parse large FCD files (default: CPU count).
+        fcd_cache_dir (str|None): Directory to cache the parsed FCD data in, so re-runs on an
+            unchanged FCD file skip the XML parse (default: no cache).
     """
     cfg = _parse_sumocfg(config_path)
     events, station_metrics, vehicles = _load_charging_events(cfg["charging_xml_path"])
 
+    # (edge_id, index) of every station, parsed once for all the steps below
+    station_edges = _station_edges(station_metrics)
+
     # Infer stations-per-group from events
     inferred_counts = {}
     for sid in station_metrics.keys():
-        edge_id, _ = _extract_edge_and_index(sid)
+        edge_id, _ = station_edges[sid]
         inferred_counts[edge_id] = inferred_counts.get(edge_id, 0) + 1
 
     # Build effective counts per edge
@@ -425,7 +738,8 @@ def extract_charging_metrics_from_sumocfg(config_path, output_json_path, cs_size
 
     # Waits (queue entry -> charging begin) and Queues (per session)
     per_station_waits, per_station_queues = _compute_session_waits_and_queues(
-        events, cfg["fcd_xml_path"], effective_cs_count_by_edge
+        events, cfg["fcd_xml_path"], effective_cs_count_by_edge, n_workers=n_workers,
+        station_edges=station_edges, cache_dir=fcd_cache_dir
     )
 
     # Attach waits & queues to station metrics
@@ -439,14 +753,15 @@ def extract_charging_metrics_from_sumocfg(config_path, output_json_path, cs_size
     per_group, totals = _compute_group_and_totals(
         station_metrics, cfg["sim_duration"],
         effective_cs_count_by_edge=effective_cs_count_by_edge,
-        cs_size=cs_size
+        cs_size=cs_size,
+        station_edges=station_edges
     )
 
-    full_output = _round_floats({
+    _round_charging_metrics(station_metrics, per_group, totals)
+    full_output = {
         "per_station": station_metrics,
         "per_group": per_group,
         "totals": totals
-    })
+    }
 
-    with open(output_json_path, "w") as f:
-        json.dump(full_output, f, indent=4)
+    _write_json(full_output, output_json_path)
@@ -1,6 +1,12 @@
 import traci
+import traci.constants as tc
 import os
+import re
+import json
 import xml.etree.ElementTree as ET
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
 '''
 SAMPLE USE AT MAIN SIMULATION FILE:
     import emissions
@@ -9,11 +15,11 @@ SAMPLE USE AT MAIN SIMULATION FILE:
 
     # Initialize the simulation information
     simulationData = emissions.get_initial_simulation_information()
-    vehicleEmissions = {}
+    vehicleEmissions = emissions.new_vehicle_emissions()
 
-    # EXECUTE the simulation BY steps
+    # EXECUTE the simulation BY steps (one row per vehicle and step is added to the columns)
     while traci.simulation.getMinExpectedNumber() > 0:
-        vehicleEmissions[int(traci.simulation.getTime())] = emissions.get_instant_vehicle_emissions(simulationData)
+        emissions.get_instant_vehicle_emissions(simulationData, vehicleEmissions)
         traci.simulationStep()
     
     # Get the final simulation information
@@ -34,17 +40,30 @@ def get_initial_simulation_information(saveStreetMap=True, saveBuildings=True, b
     simulationData['simulationStepTime'] = traci.simulation.getDeltaT()
     mapSize = traci.simulation.getNetBoundary()
     simulationData['mapSize'] = {"minX": mapSize[0][0], "minY": mapSize[0][1], "maxX": mapSize[1][0], "maxY": mapSize[1][1]}
+    # Map vehicle ID from string to int, filled as vehicles are recorded
+    simulationData['vehicleIDStr2IDInt'] = {}
     if saveStreetMap:
-        simulationData['map'] = get_map()
-    if saveBuildings:
-        simulationData['buildings'] = get_buildings(buildingFilePath, applyOriginOffset, networkFilePath)
-    if saveVegetation:
-        simulationData['vegetation'] = get_vegetation(vegetationFilePath, listOfVegetationTags, applyOriginOffset, networkFilePath)
+        simulationData['map'] = get_map(networkFilePath)
+    if saveBuildings and saveVegetation and buildingFilePath == vegetationFilePath:
+        # Same polygon file: scan it only once for both layers
+        simulationData['buildings'], simulationData['vegetation'] = get_polygons(buildingFilePath, applyOriginOffset, networkFilePath,
+                                                                                 listOfVegetationTags=listOfVegetationTags)
+    else:
+        if saveBuildings:
+            simulationData['buildings'] = get_buildings(buildingFilePath, applyOriginOffset, networkFilePath)
+        if saveVegetation:
+            simulationData['vegetation'] = get_vegetation(vegetationFilePath, listOfVegetationTags, applyOriginOffset, networkFilePath)
     return simulationData
 
 
-def get_map():
+def get_map(networkFilePath=""):
+    if networkFilePath:
+        # Static topology read straight from the network file, without TraCI round trips
+        return get_map_from_network(networkFilePath)
+
     mapData = {"edges": []}
+    # Junction positions are shared by several edges: ask TraCI once per junction
+    junctionPositions = {}
     for edgeID in traci.edge.getIDList():
         # Number of lanes in the edge
         numLanes = traci.edge.getLaneNumber(edgeID)
@@ -54,8 +73,12 @@ def get_map():
         endJointID = traci.edge.getToJunction(edgeID)
 
         # Get joints positions (x,y)
-        initJointPosition = traci.junction.getPosition(initJointID)
-        endJointPosition = traci.junction.getPosition(endJointID)
+        initJointPosition = junctionPositions.get(initJointID)
+        if initJointPosition is None:
+            initJointPosition = junctionPositions[initJointID] = traci.junction.getPosition(initJointID)
+        endJointPosition = junctionPositions.get(endJointID)
+        if endJointPosition is None:
+            endJointPosition = junctionPositions[endJointID] = traci.junction.getPosition(endJointID)
 
         # Filter edges with no length
         if initJointPosition == endJointPosition:
@@ -67,102 +90,159 @@ def get_map():
 
     return mapData
 
-def get_buildings(buildingFilePath, applyOriginOffset, networkFilePath):
-    buildingsData = []
 
-    # Open building (polygon) xml file from OSM and access to xml tree root
-    polygonXmlTreeRoot = ET.parse(buildingFilePath).getroot()
-    
-    # Calculate offset between buildings and street origin point
-    originOffset = get_origin_offset(polygonXmlTreeRoot, applyOriginOffset, networkFilePath)
+def get_map_from_network(networkFilePath):
+    import sumolib
 
-    # Iterate through each child to find buildings polygons
-    for child in polygonXmlTreeRoot:
-        if "type" in child.attrib and "building" in child.attrib["type"] and "shape" in child.attrib:
-            listOfRawPoints = child.attrib["shape"].split(" ")
-            poligonFormatPoint = format_raw_poligon(listOfRawPoints, originOffset)
-            # Add building info (list of point in [x,y] format)
-            buildingsData.append(poligonFormatPoint)
+    mapData = {"edges": []}
+    net = sumolib.net.readNet(networkFilePath)
+    for edge in net.getEdges():
+        initJointPosition = edge.getFromNode().getCoord()
+        endJointPosition = edge.getToNode().getCoord()
 
-    return buildingsData
+        # Filter edges with no length
+        if initJointPosition == endJointPosition:
+            continue
 
+        mapData["edges"].append({"edgeID": edge.getID(), "numLanes": edge.getLaneNumber(), 
+                                    "initX": initJointPosition[0], "initY": initJointPosition[1], 
+                                    "endX": endJointPosition[0], "endY": endJointPosition[1]})
 
-def get_vegetation(vegetationFilePath, listOfVegetationTags, applyOriginOffset, networkFilePath):
-        vegetationData = []
+    return mapData
 
-        # Open building (polygon) xml file from OSM and access to xml tree root
-        polygonXmlTreeRoot = ET.parse(vegetationFilePath).getroot()
+def get_polygons(polygonFilePath, applyOriginOffset, networkFilePath, getBuildings=True, listOfVegetationTags=()):
+    buildingsData = []
+    vegetationData = []
+    originOffset = [0.0, 0.0]
+    # One regex scan per polygon type instead of a substring test per vegetation tag
+    vegetationPattern = re.compile("|".join(map(re.escape, listOfVegetationTags))) if listOfVegetationTags else None
 
-        # Calculate offset between buildings and street origin point
-        originOffset = get_origin_offset(polygonXmlTreeRoot, applyOriginOffset, networkFilePath)
+    # Stream polygon xml file from OSM, keeping only the current element in memory
+    context = ET.iterparse(polygonFilePath, events=("start", "end"))
+    _, root = next(context)
 
-        # Iterate through each child to find vegetation polygons (has one type of listOfVegetationTags with shape atributte)
-        for child in polygonXmlTreeRoot:
-            for tag in listOfVegetationTags:
-                if "type" in child.attrib and tag in child.attrib["type"] and "shape" in child.attrib:
-                    listOfRawPoints = child.attrib["shape"].split(" ")
-                    poligonFormatPoint = format_raw_poligon(listOfRawPoints, originOffset)
-                    # Add vegetation info (list of point in [x,y] format)
-                    vegetationData.append(poligonFormatPoint)
-                    break
+    for event, child in context:
+        if event != "end":
+            continue
+        if child.tag == "location":
+            # Calculate offset between polygons and street origin point
+            originOffset = get_origin_offset(child, applyOriginOffset, networkFilePath)
+        elif child.tag == "poly":
+            polyType = child.get("type")
+            shape = child.get("shape")
+            if polyType is not None and shape is not None:
+                isBuilding = getBuildings and "building" in polyType
+                # Vegetation polygons have one type of listOfVegetationTags
+                isVegetation = vegetationPattern is not None and vegetationPattern.search(polyType) is not None
+                if isBuilding or isVegetation:
+                    # List of point in [x,y] format
+                    poligonFormatPoint = format_raw_poligon(shape, originOffset)
+                    if isBuilding:
+                        buildingsData.append(poligonFormatPoint)
+                    if isVegetation:
+                        vegetationData.append(poligonFormatPoint)
+        root.clear()
+
+    return buildingsData, vegetationData
 
-        return vegetationData
+
+def get_buildings(buildingFilePath, applyOriginOffset, networkFilePath):
+    buildingsData, _ = get_polygons(buildingFilePath, applyOriginOffset, networkFilePath)
+    return buildingsData
+
+
+def get_vegetation(vegetationFilePath, listOfVegetationTags, applyOriginOffset, networkFilePath):
+    _, vegetationData = get_polygons(vegetationFilePath, applyOriginOffset, networkFilePath,
+                                     getBuildings=False, listOfVegetationTags=listOfVegetationTags)
+    return vegetationData
 
 
-def get_origin_offset(polygonXmlTreeRoot, applyOriginOffset, networkFilePath):
+def get_origin_offset(polygonLocation, applyOriginOffset, networkFilePath):
         # Calculate offset between buildings and street origin point
         if applyOriginOffset:
-            #   1) Open network xml file from OSM 
-            networkXmlTreeRoot = ET.parse(networkFilePath).getroot()
-            #   2) Get the "netOffset" attribute of "location" element of network and polygon xml
-            networkOffset = networkXmlTreeRoot[0].attrib["netOffset"].split(",")
-            buildingOffset = polygonXmlTreeRoot[0].attrib["netOffset"].split(",")
-            #   3) Calculate the difference in origin offset between both data sources
-            originOffset = [float(networkOffset[0])-float(buildingOffset[0]), float(networkOffset[1])-float(buildingOffset[1])]
+            #   1) Get the "netOffset" attribute of "location" element of network and polygon xml
+            networkOffset = get_network_offset(networkFilePath)
+            buildingOffset = polygonLocation.attrib["netOffset"].split(",")
+            #   2) Calculate the difference in origin offset between both data sources
+            originOffset = [networkOffset[0]-float(buildingOffset[0]), networkOffset[1]-float(buildingOffset[1])]
         else:
             originOffset = [0.0, 0.0]
         return originOffset
 
 
-def format_raw_poligon(listOfRawPoints, originOffset):
-        # Convert from raw string format to list of [x,y] points with offset applied
-        poligonFormatPoint = []
-        for rawPoint in listOfRawPoints:
-            strPoint = list(rawPoint.split(","))
-            formatOffsetPoint = [float(strPoint[0])+originOffset[0], float(strPoint[1])+originOffset[1]]
-            poligonFormatPoint.append(formatOffsetPoint)
-        return poligonFormatPoint
+@lru_cache(maxsize=None)
+def get_network_offset(networkFilePath):
+        # "location" is the first element of the network xml file from OSM: stop reading there
+        # instead of parsing the whole network (the result is cached per file)
+        for _, child in ET.iterparse(networkFilePath, events=("end",)):
+            if child.tag == "location":
+                networkOffset = child.attrib["netOffset"].split(",")
+                return float(networkOffset[0]), float(networkOffset[1])
+        raise ValueError(f"No location element in {networkFilePath}")
+
+
+def format_raw_poligon(rawShape, originOffset):
+        # Convert from raw "x1,y1 x2,y2 ..." shape to list of [x,y] points with offset applied
+        # (one split of the whole shape and a C-level float map instead of a split per point)
+        offsetX, offsetY = originOffset
+        coordinates = map(float, rawShape.replace(",", " ").split())
+        return [[x+offsetX, y+offsetY] for x, y in zip(coordinates, coordinates)]
 
 
 def get_final_simulation_information(simulationData, vehicleEmissions):
     simulationData['duration'] = traci.simulation.getTime()
-    simulationData['vehicleIDStr2IDInt'] = mapStrID2IntID(vehicleEmissions)
-    
+    simulationData['steps'] = vehicleEmissions["steps"]
 
-def mapStrID2IntID(vehicleEmissions):
-    # Map vehicle ID from string to int
-    vehicleIDStr2IDInt = {}
-    # Get all vehicle unique id (string) 
-    uniqueStrID = []
-    [uniqueStrID.append(vehicleID) for time, vehicle in vehicleEmissions.items() for vehicleID in vehicle.keys()]
-    uniqueStrID = list(set(uniqueStrID))
-    for intID in range(len(uniqueStrID)):
-        vehicleIDStr2IDInt[uniqueStrID[intID]] = intID
-    return vehicleIDStr2IDInt
-
-def get_instant_vehicle_emissions(simulationData):
-    vehicleEmissions = {}
-    for vehicleID in traci.vehicle.getIDList():
-        vehicleEmissions[vehicleID] = {
-            "position": traci.vehicle.getPosition(vehicleID),
-            "CO2": traci.vehicle.getCO2Emission(vehicleID)*simulationData['simulationStepTime'], # mg/step or mg
-            "CO": traci.vehicle.getCOEmission(vehicleID)*simulationData['simulationStepTime'], # mg/step or mg
-            "HC": traci.vehicle.getHCEmission(vehicleID)*simulationData['simulationStepTime'], # mg/step or mg
-            "NOx": traci.vehicle.getNOxEmission(vehicleID)*simulationData['simulationStepTime'], # mg/step or mg
-            "PMx": traci.vehicle.getPMxEmission(vehicleID)*simulationData['simulationStepTime'], # mg/step or mg
-            "noise": traci.vehicle.getNoiseEmission(vehicleID) #dB
-        }
-    
+
+# Per-row value columns of the vehicle emissions store
+EMISSION_COLUMNS = ("x", "y", "CO2", "CO", "HC", "NOx", "PMx", "noise")
+
+def new_vehicle_emissions():
+    # Columnar (structure of arrays) store with one row per vehicle and step:
+    # "step" and "vehicle" (int code, see simulationData['vehicleIDStr2IDInt']) identify the row, the
+    # EMISSION_COLUMNS hold its values as contiguous C doubles
+    vehicleEmissions = {"steps": 0, "step": array("I"), "vehicle": array("I")}
+    for column in EMISSION_COLUMNS:
+        vehicleEmissions[column] = array("d")
+    return vehicleEmissions
+
+
+# Vehicle variables read through TraCI subscriptions: one batched reply per step
+# instead of one round trip per variable and vehicle
+EMISSION_SUBSCRIPTION_VARS = (tc.VAR_POSITION, tc.VAR_CO2EMISSION, tc.VAR_COEMISSION, tc.VAR_HCEMISSION,
+                              tc.VAR_NOXEMISSION, tc.VAR_PMXEMISSION, tc.VAR_NOISEEMISSION)
+
+def get_instant_vehicle_emissions(simulationData, vehicleEmissions):
+    dt = simulationData['simulationStepTime']
+    vehicle = traci.vehicle
+    subscriptionResults = vehicle.getAllSubscriptionResults()
+
+    step = vehicleEmissions["steps"]
+    vehicleIDs = simulationData['vehicleIDStr2IDInt']
+    stepColumn, vehicleColumn = vehicleEmissions["step"], vehicleEmissions["vehicle"]
+    xColumn, yColumn = vehicleEmissions["x"], vehicleEmissions["y"]
+    co2Column, coColumn, hcColumn = vehicleEmissions["CO2"], vehicleEmissions["CO"], vehicleEmissions["HC"]
+    noxColumn, pmxColumn, noiseColumn = vehicleEmissions["NOx"], vehicleEmissions["PMx"], vehicleEmissions["noise"]
+
+    for vehicleID in vehicle.getIDList():
+        values = subscriptionResults.get(vehicleID)
+        if values is None:
+            # New vehicle: subscribe it (the subscription reply already carries the current values)
+            vehicle.subscribe(vehicleID, EMISSION_SUBSCRIPTION_VARS)
+            values = vehicle.getSubscriptionResults(vehicleID)
+        x, y = values[tc.VAR_POSITION]
+        stepColumn.append(step)
+        vehicleColumn.append(vehicleIDs.setdefault(vehicleID, len(vehicleIDs)))
+        xColumn.append(x)
+        yColumn.append(y)
+        co2Column.append(values[tc.VAR_CO2EMISSION]*dt) # mg/step or mg
+        coColumn.append(values[tc.VAR_COEMISSION]*dt) # mg/step or mg
+        hcColumn.append(values[tc.VAR_HCEMISSION]*dt) # mg/step or mg
+        noxColumn.append(values[tc.VAR_NOXEMISSION]*dt) # mg/step or mg
+        pmxColumn.append(values[tc.VAR_PMXEMISSION]*dt) # mg/step or mg
+        noiseColumn.append(values[tc.VAR_NOISEEMISSION]) #dB
+
+    vehicleEmissions["steps"] = step + 1
     return vehicleEmissions
 
 
@@ -171,16 +251,35 @@ def save_output_data(simulationData, vehicleEmissions, outputFolder):
     os.makedirs(outputFolder, exist_ok=True)
 
     # Save simulation information
-    simulationDataFilePath = os.path.join(outputFolder, "simulation_data.txt")
+    simulationDataFilePath = os.path.join(outputFolder, "simulation_data.json")
     write_file(simulationData, simulationDataFilePath)
 
-    # Save vehicle emissions data
-    emissionsFilePath = os.path.join(outputFolder, "vehicle_emissions.txt")
-    write_file(vehicleEmissions, emissionsFilePath)
+    # Save vehicle emissions data (vehicle codes are mapped in simulation data)
+    emissionsFilePath = os.path.join(outputFolder, "vehicle_emissions.jsonl")
+    write_emissions_file(vehicleEmissions, emissionsFilePath)
     
     return outputFolder, simulationDataFilePath, emissionsFilePath
         
 def write_file(data, filePath):
-    file = open(filePath,"w")
-    file.write(str(data))
-    file.close()
+    # json.dump encodes incrementally, without building the whole text in memory
+    with open(filePath, "w", encoding="utf-8") as file:
+        json.dump(data, file)
+
+def write_emissions_file(vehicleEmissions, filePath):
+    # JSON Lines: one {"step", "vehicle", "x", "y", "CO2", ...} record per step, so only
+    # the rows of one step are converted to Python objects at a time
+    columns = ("vehicle",) + EMISSION_COLUMNS
+    stepColumn = vehicleEmissions["step"]
+    numRows = len(stepColumn)
+    with open(filePath, "w", encoding="utf-8") as file:
+        start = 0
+        while start < numRows:
+            step = stepColumn[start]
+            # Rows are appended step by step, so the step column is sorted
+            end = bisect_right(stepColumn, step, start)
+            record = {"step": step}
+            for column in columns:
+                record[column] = vehicleEmissions[column][start:end].tolist()
+            file.write(json.dumps(record))
+            file.write("\n")
+            start = end
@@ -1,55 +1,77 @@
 import random
 import os
 import json
+import logging
+from pathlib import Path
 from config import GA_PARAMS
 import sys
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(parent_dir)
 import simulation
 
+logger = logging.getLogger(__name__)
+
+# GA config template, loaded once per process (see load_config)
+_CONFIG = None
+
+def load_config():
+    global _CONFIG
+    if _CONFIG is None:
+        with open(GA_PARAMS["config_file"], "r", encoding="utf-8") as f:
+            _CONFIG = json.load(f)
+    return _CONFIG
+
+def _load_metrics(results_folder):
+    # Charging, rerouting and traffic metrics of a simulation run
+    # (json.loads on the raw bytes skips the text-mode decoding layer)
+    folder = Path(results_folder)
+    return tuple(json.loads(folder.joinpath(name).read_bytes())
+                 for name in ("charging_metrics.json", "rerouting_metrics.json", "traffic_metrics.json"))
+
+def init_worker():
+    # Pool initializer: the worker keeps the config loaded for all its evaluations
+    load_config()
+
 class Individual:
     def __init__(self, length=None, n_edges=None, genome=None, fitness=None):        
-        self.genome = genome or random.sample(range(n_edges), length)
-        self.fitness = fitness or None
+        self.genome = genome if genome is not None else random.sample(range(n_edges), length)
+        self.fitness = fitness
 
     def evaluate(self, rank=0):
-        print("Evaluating individual with genome:", self.genome)
+        logger.info("Evaluating individual with genome: %s", self.genome)
         cs_list = [GA_PARAMS["cs_list"][i] for i in self.genome]
-        print("Evaluating individual with CSs:", cs_list)
+        logger.info("Evaluating individual with CSs: %s", cs_list)
         
-        with open(GA_PARAMS["config_file"], "r", encoding="utf-8") as f:
-            config = json.load(f)
+        # Per-run copy of the cached template, so run-specific keys never leak into it
+        config = dict(load_config())
         
         #config['CS_LIST'] = cs_list
-        print("Running simulation with config:", config)
+        logger.debug("Running simulation with config: %s", config)
         results_folder = simulation.run(config, port=8814+rank)        
-        print(f"Simulation completed. Results in folder: {results_folder}")
+        logger.info("Simulation completed. Results in folder: %s", results_folder)
         
-        with open(results_folder+'charging_metrics.json', "r", encoding="utf-8") as f:
-            charging_metrics = json.load(f)
+        charging_metrics, rerouting_metrics, traffic_metrics = _load_metrics(results_folder)
         #print("Charging metrics:", charging_metrics)
-        with open(results_folder+'rerouting_metrics.json', "r", encoding="utf-8") as f:
-            rerouting_metrics = json.load(f)
         #print("Rerouting metrics:", rerouting_metrics)
-        with open(results_folder+'traffic_metrics.json', "r", encoding="utf-8") as f:
-            traffic_metrics = json.load(f)
         #print("Traffic metrics:", traffic_metrics)
         
         # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
         self.fitness = sum(self.genome)  # Placeholder for actual fitness calculation!!
-        print(f"Calculated fitness: {self.fitness} with rank {rank}")
+        logger.info("Calculated fitness: %s with rank %s", self.fitness, rank)
         # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
         
     def mutate(self, n_edges=50):
-        while True:
-            index = random.randint(0, len(self.genome) - 1)
-            new_edge = random.randint(0, n_edges - 1)
-            if new_edge not in self.genome:
-                self.genome[index] = new_edge
-                break
+        # Pick the new edge among the ones not in the genome, instead of drawing until one is free
+        used = set(self.genome)
+        available = [edge for edge in range(n_edges) if edge not in used]
+        if not available:
+            return
+        index = random.randrange(len(self.genome))
+        self.genome[index] = random.choice(available)
 
     def copy(self):
-        return Individual(genome=self.genome)
+        # The copy keeps the fitness, so it is not simulated again
+        return Individual(genome=list(self.genome), fitness=self.fitness)
 
     def __str__(self):
         return f"Genome: {self.genome}, Fitness: {self.fitness}"
\ No newline at end of file
@@ -1,11 +1,17 @@
+import logging
 from config import GA_PARAMS
 from population import Population
 from mpi4py import MPI
 
+logger = logging.getLogger(__name__)
+
 comm = MPI.COMM_WORLD
 rank = comm.Get_rank()
 
 if __name__ == "__main__":
+    # Progress of the evaluations; use logging.DEBUG to also log the simulation configs
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s: %(message)s")
+
     # Only root initializes the population
     if rank == 0:
         pop = Population(GA_PARAMS)
@@ -20,8 +26,8 @@ if __name__ == "__main__":
     # Evolution loop
     for gen in range(GA_PARAMS["generations"]):
         if rank == 0:
-            print(f"Generation {gen + 1}/{GA_PARAMS['generations']}")
-            print(pop)
+            logger.info("Generation %s/%s", gen + 1, GA_PARAMS["generations"])
+            logger.info("Population:\n%s", pop)
             pop.evolve()   # root evolves population
 
         # Parallel evaluation with MPI
@@ -30,4 +36,4 @@ if __name__ == "__main__":
     # Final result only on root
     if rank == 0:
         best = pop.get_best()
-        print("Best solution:", best.genome, "Fitness:", best.fitness)
+        logger.info("Best solution: %s Fitness: %s", best.genome, best.fitness)
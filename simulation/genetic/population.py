@@ -1,53 +1,99 @@
 import random
-from multiprocessing import Pool
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import os
-from individual import Individual
+import logging
+from itertools import chain
+from individual import Individual, init_worker
 from config import GA_PARAMS
 from mpi4py import MPI
 
+logger = logging.getLogger(__name__)
+
 class Population:
     def __init__(self, params):
         self.params = params
         self.individuals = []
+        self.pool = None
+        # Fitness of every genome simulated so far (see genome_key)
+        self.fitness_cache = {}
 
     def initialize(self):
-        self.individuals = [Individual(length=self.params["chromosome_length"],n_edges=len(GA_PARAMS["cs_list"])) for _ in range(self.params["population_size"])]
+        # One random.sample per genome, over an edge range built once for all of them
+        length = self.params["chromosome_length"]
+        edges = range(len(GA_PARAMS["cs_list"]))
+        sample = random.sample
+        self.individuals = [Individual(genome=sample(edges, length)) for _ in range(self.params["population_size"])]
+
+    def evaluate(self, n_workers=1):
+        if n_workers > 1:
+            # Simulations run concurrently, each in its own worker process and port
+            self.evaluate_multithread(n_threads=n_workers)
+            return
+        pending = self.pending_individuals()
+        for ind in pending:
+            ind.evaluate()
+        self.fill_cached_fitness(pending)
 
-    def evaluate(self):
+    def pending_individuals(self):
+        # Individuals that still need a simulation: one per genome not evaluated yet
+        self.fill_cached_fitness()
+        pending = {}
         for ind in self.individuals:
-            ind.evaluate()
+            if ind.fitness is None:
+                pending.setdefault(genome_key(ind.genome), ind)
+        return list(pending.values())
+
+    def fill_cached_fitness(self, evaluated=()):
+        cache = self.fitness_cache
+        for ind in evaluated:
+            cache[genome_key(ind.genome)] = ind.fitness
+        for ind in self.individuals:
+            if ind.fitness is None:
+                ind.fitness = cache.get(genome_key(ind.genome))
 
     def evolve(self):
+        n_edges = len(GA_PARAMS["cs_list"])
+        population_size = self.params["population_size"]
+        elitism_size = self.params["elitism_size"]
+        mutation_prob = self.params["mutation_prob"]
+        length = self.params["chromosome_length"]
+
         new_individuals = []
         # First, we add the best individual to the new population
         self.individuals.sort(key=lambda ind: ind.fitness, reverse=True)
-        for ind in self.individuals[:self.params["elitism_size"]]:
+        for ind in self.individuals[:elitism_size]:
             new_individuals.append(ind.copy())
+        fitness = [ind.fitness for ind in self.individuals]
 
         # Then, we evolve part of the population using tournament selection
-        while len(new_individuals) < self.params["population_size"]- self.params["elitism_size"]:
-            parents = self.tournament_selection(self.individuals)
+        while len(new_individuals) < population_size - elitism_size:
+            parents = self.tournament_selection(self.individuals, fitness=fitness)
             new_individual = self.crossover(parents[0], parents[1])
-            if random.random() < self.params["mutation_prob"]:
-                new_individual.mutate(n_edges=len(GA_PARAMS["cs_list"]))
+            if random.random() < mutation_prob:
+                new_individual.mutate(n_edges=n_edges)
             new_individuals.append(new_individual)
 
         # Finally, we add the same number of new individuals as the elitism size
-        while len(new_individuals) < self.params["population_size"]:
-            new_individuals.append(Individual(length=self.params["chromosome_length"],n_edges=len(GA_PARAMS["cs_list"])))
+        while len(new_individuals) < population_size:
+            new_individuals.append(Individual(length=length, n_edges=n_edges))
 
         self.individuals = new_individuals
             
 
-    def tournament_selection(self, population, tournament_size=1, n_winners=2):
+    def tournament_selection(self, population, tournament_size=1, n_winners=2, fitness=None):
+        # fitness: optional list with the fitness of each individual of population,
+        # so a tournament compares plain floats by index
+        if fitness is None:
+            fitness = [ind.fitness for ind in population]
+        candidates = range(len(population))
         winners = []
         for _ in range(n_winners):
             # Elegir individuos al azar
-            tournament = random.sample(population, tournament_size)
+            tournament = random.sample(candidates, tournament_size)
             
             # Elegir el mejor del torneo
-            best = max(tournament, key=lambda ind: ind.fitness)
-            winners.append(best)
+            best = max(tournament, key=fitness.__getitem__)
+            winners.append(population[best])
         return winners
 
 
@@ -56,13 +102,16 @@ class Population:
         genome1 = parent1.genome
         crossover_point = random.randint(1, len(genome1) - 1)
         child_edges = genome1[:crossover_point] 
-
-        # Add the rest of the parent2's genome
-        i = 0
-        while len(child_edges) < len(genome1):
-            if parent2.genome[i] not in child_edges:
-                child_edges.append(parent2.genome[i])
-            i += 1
+        seen = set(child_edges)
+
+        # Add the rest of the parent2's genome (set lookups instead of scanning the child)
+        length = len(genome1)
+        for edge in parent2.genome:
+            if len(child_edges) == length:
+                break
+            if edge not in seen:
+                child_edges.append(edge)
+                seen.add(edge)
         
         return Individual(genome=child_edges)
 
@@ -94,61 +143,89 @@ class Population:
         local_chunk = self.individuals[start:end]
         for ind in local_chunk:
             ind.evaluate()
-            print(f"Proceso {rank} evaluando individuo {ind.genome} con fitness {ind.fitness}")
+            logger.info("Proceso %s evaluando individuo %s con fitness %s", rank, ind.genome, ind.fitness)
 
         # Recolectar resultados de todos los procesos
         all_chunks = comm.gather(local_chunk, root=0)
         if rank == 0:
             self.individuals = all_chunks
 
-        print(f"Proceso {rank} ha terminado de evaluar sus individuos.")
-        print(self)
+        logger.info("Proceso %s ha terminado de evaluar sus individuos.", rank)
+        logger.info("Population:\n%s", self)
     """
 
     def evaluate_multithread(self, n_threads=3):
-        with Pool(n_threads) as pool:
-            result = pool.map(self.evaluate_ind, self.individuals)
-        self.individuals = result
-       
-            
-    def evaluate_ind(self, ind):     
-        ind.evaluate()
-        pid = os.getpid()
-        print(f"[Proceso {pid}] Resultado: {ind}")
-        return ind
+        # The pool is kept across generations, so workers are started (and load the config) once
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=n_threads, initializer=init_worker)
+        pending = self.pending_individuals()
+        # Each individual gets its own rank, so concurrent simulations use different ports.
+        # simulation.run keeps its state in module globals and the default TraCI connection,
+        # so concurrent runs need separate processes (threads would share them)
+        # Only the genome goes to the worker and only the fitness comes back
+        futures = {self.pool.submit(evaluate_ind, ind.genome, rank): ind for rank, ind in enumerate(pending)}
+        # Record each fitness as soon as its simulation finishes
+        for future in as_completed(futures):
+            ind = futures[future]
+            ind.fitness = future.result()
+            self.fill_cached_fitness((ind,))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
     
     def evaluate_mpi(self):
         comm = MPI.COMM_WORLD
         rank = comm.Get_rank()
         size = comm.Get_size()
 
-        # Broadcast current population from root to all ranks
-        self.individuals = comm.bcast(self.individuals if rank == 0 else None, root=0)
-
-        # Compute balanced slice indices for each rank
-        n = len(self.individuals)
-        chunk_size = n // size
-        remainder = n % size
-
-        if rank < remainder:
-            start = rank * (chunk_size + 1)
-            end = start + (chunk_size + 1)
+        # Only genomes are sent to the ranks and only fitness values come back,
+        # instead of pickling whole Individuals both ways
+        if rank == 0:
+            pending = self.pending_individuals()
+
+            # Compute balanced slice indices for each rank
+            n = len(pending)
+            chunk_size = n // size
+            remainder = n % size
+
+            chunks = []
+            start = 0
+            for r in range(size):
+                end = start + chunk_size + (1 if r < remainder else 0)
+                chunks.append([ind.genome for ind in pending[start:end]])
+                start = end
         else:
-            start = rank * chunk_size + remainder
-            end = start + chunk_size
+            chunks = None
+        local_genomes = comm.scatter(chunks, root=0)
 
         # Local evaluation (each rank evaluates its assigned chunk)
-        local_chunk = self.individuals[start:end]
-        for ind in local_chunk:
+        local_fitness = []
+        for genome in local_genomes:
+            ind = Individual(genome=genome)
             ind.evaluate(rank=rank)
-            print(f"Proceso {rank} evaluando individuo {ind.genome} con fitness {ind.fitness}")
+            logger.info("Proceso %s evaluando individuo %s con fitness %s", rank, ind.genome, ind.fitness)
+            local_fitness.append(ind.fitness)
 
-        # Synchronize all ranks and gather results
-        comm.Barrier()
-        all_chunks = comm.gather(local_chunk, root=0)
+        # Gather results (chunks arrive in rank order, i.e. population order)
+        all_fitness = comm.gather(local_fitness, root=0)
         if rank == 0:
-            self.individuals = [ind for chunk in all_chunks for ind in chunk]
+            for ind, fitness in zip(pending, chain.from_iterable(all_fitness)):
+                ind.fitness = fitness
+            self.fill_cached_fitness(pending)
 
-        print(f"Proceso {rank} ha terminado de evaluar sus individuos.")
+        logger.info("Proceso %s ha terminado de evaluar sus individuos.", rank)
         if rank == 0:
-            print(self)
\ No newline at end of file
+            logger.info("Population:\n%s", self)
+
+def genome_key(genome):
+    # The order of the stations in a genome does not change the simulated scenario
+    return tuple(sorted(genome))
+
+def evaluate_ind(genome, rank=0):
+    ind = Individual(genome=genome)
+    ind.evaluate(rank=rank)
+    pid = os.getpid()
+    logger.info("[Proceso %s] Resultado: %s", pid, ind)
+    return ind.fitness
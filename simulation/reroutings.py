@@ -1,5 +1,15 @@
+import sys
 import math
 import json
+import heapq
+from array import array
+from collections import defaultdict
+from itertools import chain
+
+try:  # optional: faster JSON encoder for the output file
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
 
 # ---------- Helpers (IDs, stats containers) ----------
 
@@ -13,114 +23,184 @@ def get_group_id(cs_id: str) -> str:
     parts = cs_id.split("_")
     return parts[1] if len(parts) >= 3 else ""
 
-def _new_station_data():
-    """Per-station container (time-only metrics)."""
-    return {
-        "sessions": 0,
-
-        # Per-session search durations for this station (DESTINATION side)
-        "search_times": [],
+class StationData:
+    """Per-station container (time-only metrics); slotted, one per charging station."""
+
+    __slots__ = (
+        "sessions",
+        "search_times",
+        "avg_search_time",
+        "p95_search_time",
+        "reroute_in_times",
+        "reroute_in_count",
+        "reroute_out_times",
+        "reroute_out_count",
+        "avg_reroute_in_time",
+        "p95_reroute_in_time",
+        "avg_reroute_out_time",
+        "p95_reroute_out_time",
+        "_sessions_with_in",
+        "_sessions_with_out",
+        "_search_time_sum",
+        "_reroute_in_time_sum",
+        "_reroute_out_time_sum",
+        "_group_id",
+    )
+
+    def __init__(self, group_id=""):
+        self.sessions = 0
+
+        # Per-session search durations for this station (DESTINATION side);
+        # the sample lists are array('d'), i.e. unboxed C doubles
+        self.search_times = array("d")
 
         # Station-level aggregates (filled at finalize)
-        "avg_search_time": None,
-        "p95_search_time": None,
+        self.avg_search_time = None
+        self.p95_search_time = None
 
         # Reroute IN (lists + count)
-        "reroute_in_times": [],
-        "reroute_in_count": 0,
+        self.reroute_in_times = array("d")
+        self.reroute_in_count = 0
 
         # Reroute OUT (lists + count)
-        "reroute_out_times": [],
-        "reroute_out_count": 0,
+        self.reroute_out_times = array("d")
+        self.reroute_out_count = 0
 
         # IN-only aggregates at station level (as per your example)
-        "avg_reroute_in_time": None,
-        "p95_reroute_in_time": None,
+        self.avg_reroute_in_time = None
+        self.p95_reroute_in_time = None
 
         # OUT aggregates (added)
-        "avg_reroute_out_time": None,
-        "p95_reroute_out_time": None,
+        self.avg_reroute_out_time = None
+        self.p95_reroute_out_time = None
 
         # --- internal only (not written to final JSON) ---
-        "_sessions_with_in": 0,   # sessions at this station with ≥1 IN (destination side)
-        "_sessions_with_out": 0,  # sessions at this station with ≥1 OUT (origin side)
-    }
+        self._sessions_with_in = 0   # sessions at this station with ≥1 IN (destination side)
+        self._sessions_with_out = 0  # sessions at this station with ≥1 OUT (origin side)
+        # Running sums of the time lists (averages need no pass over the samples)
+        self._search_time_sum = 0.0
+        self._reroute_in_time_sum = 0.0
+        self._reroute_out_time_sum = 0.0
+        # Group of the station, resolved once when the station is created
+        self._group_id = group_id
+
+    def to_dict(self):
+        """Public fields, in declaration order, as written to the final JSON (samples rounded to 2 decimals)."""
+        out = {k: getattr(self, k) for k in _STATION_PUBLIC_FIELDS}
+        for k in ("search_times", "reroute_in_times", "reroute_out_times"):
+            out[k] = [round(v, 2) for v in out[k]]
+        return out
+
+_STATION_PUBLIC_FIELDS = tuple(k for k in StationData.__slots__ if not k.startswith("_"))
+
+def _intern_station_group(station_groups, cs_id):
+    """
+    Group of cs_id, resolved once per run and remembered in station_groups (also
+    for the "" group); group strings are shared by all stations of a group.
+    """
+    group = station_groups.get(cs_id)
+    if group is None:
+        group = station_groups[cs_id] = sys.intern(get_group_id(cs_id))
+    return group
 
 def _percentile(values, p):
     """Inclusive p-th percentile (e.g., p=95). Returns None for empty."""
     if not values:
         return None
-    arr = sorted(values)
-    if len(arr) == 1:
-        return float(arr[0])
-    k = (p/100) * (len(arr)-1)
+    n = len(values)
+    if n == 1:
+        return float(values[0])
+    k = (p/100) * (n-1)
     f = math.floor(k)
     c = math.ceil(k)
+    # Partial selection instead of a full sort: only the values on the short side
+    # of rank f are kept (e.g. the top 5% for p95); lo/hi are the sorted values at f/c
+    if f >= n // 2:
+        top = heapq.nlargest(n - f, values)
+        lo, hi = top[-1], top[n - 1 - c]
+    else:
+        bottom = heapq.nsmallest(c + 1, values)
+        lo, hi = bottom[f], bottom[-1]
     if f == c:
-        return float(arr[int(k)])
-    return float(arr[f] + (arr[c] - arr[f]) * (k - f))
-
-def _round_floats_inplace(obj, ndigits=2):
-    """Recursively round all floats inside dict/list to ndigits (in place)."""
-    if isinstance(obj, dict):
-        for k, v in obj.items():
-            if isinstance(v, float):
-                obj[k] = round(v, ndigits)
-            else:
-                _round_floats_inplace(v, ndigits)
-    elif isinstance(obj, list):
-        for i, v in enumerate(obj):
-            if isinstance(v, float):
-                obj[i] = round(v, ndigits)
-            else:
-                _round_floats_inplace(v, ndigits)
+        return float(lo)
+    return float(lo + (hi - lo) * (k - f))
+
+def _round2(x):
+    """Round a float metric to 2 decimals as written to the JSON (None stays None)."""
+    return None if x is None else round(x, 2)
 
 # ---------- Global data for the run ----------
 
-def new_rerouting_data():
+def new_rerouting_data(station_ids=()):
     """
     Create the run-level data with primitive dicts only.
+    station_ids: optional catalog of charging-station ids (e.g. from
+    traci.chargingstation.getIDList()) whose groups are resolved up front.
     """
+    station_groups = {}
+    for cs_id in station_ids:
+        _intern_station_group(station_groups, cs_id)
     return {
-        "per_station": {},   # cs_id -> station_data
+        "per_station": {},   # cs_id -> StationData
         "per_group": {},     # filled at finalize
         "totals": {},        # filled at finalize
-        "veh_state": {},     # veh_id -> per-vehicle state
+        "veh_state": {},     # veh_id -> VehState
+        # cs_id -> group id, resolved once per station id (see _intern_station_group)
+        "_station_groups": station_groups,
 
         # Group-level denominators/numerators for %OUT
         # Denominator: sessions that STARTED searching in this group
-        "_group_session_starts": {},       # group -> int
+        "_group_session_starts": defaultdict(int),       # group -> int
         # Numerator: sessions that had ≥1 OUT away from this group
-        "_group_sessions_with_out": {},    # group -> int
+        "_group_sessions_with_out": defaultdict(int),    # group -> int
     }
 
 # ---------- Vehicle state runtime model ----------
 
-def _new_veh_state():
-    """State tracked per vehicle across ticks."""
-    return {
-        "prev_s": "",                 # previous device.stationfinder.chargingStation
-        "prev_b": "NULL",             # previous device.battery.chargingStationId
+class VehState:
+    """State tracked per vehicle across ticks; slotted, read and written on every tick."""
+
+    __slots__ = (
+        "prev_s",
+        "prev_b",
+        "search_active",
+        "search_start_t",
+        "search_target_station",
+        "search_target_group",
+        "pending_reroute_origin_group",
+        "pending_reroute_origin_station",
+        "pending_reroute_start_t",
+        "current_group",
+    )
+
+    def __init__(self):
+        self.prev_s = ""                 # previous device.stationfinder.chargingStation
+        self.prev_b = "NULL"             # previous device.battery.chargingStationId
 
         # Search tracking
-        "search_active": False,
-        "search_start_t": None,
-        "search_target_station": "",
-        "search_target_group": "",
+        self.search_active = False
+        self.search_start_t = None
+        self.search_target_station = ""
+        self.search_target_group = ""
 
         # Reroute collapsing across groups
-        # When first leaving a group, we open 'pending_reroute' and keep it open
+        # When first leaving a group, we open a pending reroute and keep it open
         # until arrival to the final destination (group), ignoring mid-group hops.
-        "pending_reroute": None,      # { origin_group, origin_station, start_t }
-        "current_group": "",          # convenience
-    }
+        # pending_reroute_start_t is None while no reroute is pending.
+        self.pending_reroute_origin_group = ""
+        self.pending_reroute_origin_station = ""
+        self.pending_reroute_start_t = None
+        self.current_group = ""          # convenience
 
 # ---------- Runtime updates per tick ----------
 
 def _ensure_station(data, cs_id):
-    if cs_id not in data["per_station"]:
-        data["per_station"][cs_id] = _new_station_data()
-    return data["per_station"][cs_id]
+    station_data = data["per_station"].get(cs_id)
+    if station_data is None:
+        station_groups = data["_station_groups"]
+        group = _intern_station_group(station_groups, cs_id)
+        station_data = data["per_station"][cs_id] = StationData(group)
+    return station_data
 
 def tick_update_vehicle(data, veh_id, now_s, now_b, now_time):
     """
@@ -131,49 +211,62 @@ def tick_update_vehicle(data, veh_id, now_s, now_b, now_time):
     - Detect inter-group changes to open/extend pending reroute (time-only).
     - Do NOT finalize here (arrival handled in handle_arrival()).
     """
-    if veh_id not in data["veh_state"]:
-        data["veh_state"][veh_id] = _new_veh_state()
-    vs = data["veh_state"][veh_id]
-
-    # ---- 1) Handle search start from s ----
-    # Start search when s goes from "" to "cs_*" and b == "NULL"
-    if (not vs["search_active"]) and now_s and now_b == "NULL":
-        vs["search_active"] = True
-        vs["search_start_t"] = now_time
-        vs["search_target_station"] = now_s
-        vs["search_target_group"] = get_group_id(now_s)
-        vs["current_group"] = vs["search_target_group"]
-
-        # Track origin group for OUT denominators
-        og = vs["search_target_group"]
-        if og:
-            data["_group_session_starts"][og] = data["_group_session_starts"].get(og, 0) + 1
-
-    # ---- 2) While searching, handle target updates ----
-    if vs["search_active"] and now_s and now_b == "NULL":
-        new_group = get_group_id(now_s)
-        old_group = vs["search_target_group"]
-
-        if new_group == old_group:
-            # Within-group change: collapse to latest station; no reroute recorded
-            vs["search_target_station"] = now_s
-            vs["current_group"] = new_group
-        else:
-            # Inter-group change: open pending_reroute if not open yet
-            if vs["pending_reroute"] is None:
-                vs["pending_reroute"] = {
-                    "origin_group": old_group,
-                    "origin_station": vs["search_target_station"],
-                    "start_t": now_time
-                }
-            # Collapse mid-groups: always aim at the latest group/station
-            vs["search_target_station"] = now_s
-            vs["search_target_group"] = new_group
-            vs["current_group"] = new_group
-
-    # Store previous s/b for next tick
-    vs["prev_s"] = now_s
-    vs["prev_b"] = now_b
+    tick_update_vehicles(data, ((veh_id, now_s, now_b),), now_time)
+
+def tick_update_vehicles(data, batch, now_time):
+    """
+    Feed one tick for a batch of vehicles: batch is an iterable of (veh_id, s, b),
+    each handled as in tick_update_vehicle(). The run-level lookups are done once
+    per batch instead of once per vehicle.
+    """
+    veh_state = data["veh_state"]
+    group_session_starts = data["_group_session_starts"]
+    station_groups = data["_station_groups"]
+
+    for veh_id, now_s, now_b in batch:
+        vs = veh_state.get(veh_id)
+        if vs is None:
+            vs = veh_state[veh_id] = VehState()
+
+        if now_s and now_b == "NULL":
+            if not vs.search_active:
+                # ---- 1) Handle search start from s ----
+                # Start search when s goes from "" to "cs_*" and b == "NULL"
+                vs.search_active = True
+                vs.search_start_t = now_time
+                vs.search_target_station = now_s
+                vs.search_target_group = _intern_station_group(station_groups, now_s)
+                vs.current_group = vs.search_target_group
+
+                # Track origin group for OUT denominators
+                og = vs.search_target_group
+                if og:
+                    group_session_starts[og] += 1
+
+            elif now_s != vs.prev_s or now_b != vs.prev_b:
+                # ---- 2) While searching, handle target updates ----
+                # (an unchanged s/b while searching already points at the current target)
+                new_group = _intern_station_group(station_groups, now_s)
+                old_group = vs.search_target_group
+
+                if new_group == old_group:
+                    # Within-group change: collapse to latest station; no reroute recorded
+                    vs.search_target_station = now_s
+                    vs.current_group = new_group
+                else:
+                    # Inter-group change: open a pending reroute if not open yet
+                    if vs.pending_reroute_start_t is None:
+                        vs.pending_reroute_origin_group = old_group
+                        vs.pending_reroute_origin_station = vs.search_target_station
+                        vs.pending_reroute_start_t = now_time
+                    # Collapse mid-groups: always aim at the latest group/station
+                    vs.search_target_station = now_s
+                    vs.search_target_group = new_group
+                    vs.current_group = new_group
+
+        # Store previous s/b for next tick
+        vs.prev_s = now_s
+        vs.prev_b = now_b
 
 def handle_arrival(data, veh_id, cs_id, now_time):
     """
@@ -187,58 +280,59 @@ def handle_arrival(data, veh_id, cs_id, now_time):
     if not cs_id or cs_id == "NULL":
         return
 
-    if veh_id not in data["veh_state"]:
-        data["veh_state"][veh_id] = _new_veh_state()
-    vs = data["veh_state"][veh_id]
+    vs = data["veh_state"].get(veh_id)
+    if vs is None:
+        vs = data["veh_state"][veh_id] = VehState()
 
     dest_station = cs_id
-    dest_group = get_group_id(dest_station)
+    station_groups = data["_station_groups"]
+    dest_group = _intern_station_group(station_groups, dest_station)
 
     # --- 1) Close search (if active) and write metrics to DESTINATION station ---
-    if vs["search_active"] and vs["search_start_t"] is not None:
-        st = float(now_time - vs["search_start_t"])
+    if vs.search_active and vs.search_start_t is not None:
+        st = float(now_time - vs.search_start_t)
         station_data = _ensure_station(data, dest_station)
-        station_data["sessions"] += 1
-        station_data["search_times"].append(st)
+        station_data.sessions += 1
+        station_data.search_times.append(st)
+        station_data._search_time_sum += st
 
     # --- 2) If there was a pending inter-group reroute, finalize IN/OUT (time only) ---
-    if vs["pending_reroute"] is not None:
-        origin_group = vs["pending_reroute"]["origin_group"]
-        origin_station = vs["pending_reroute"]["origin_station"]
-        start_t = vs["pending_reroute"]["start_t"]
-
-        # If destination group == origin group (returned to origin), discard this pending reroute.
-        if dest_group == origin_group:
-            vs["pending_reroute"] = None
-        else:
-            dur = float(now_time - start_t)
-
-            # OUT at origin station
-            if origin_station:
-                station_data_orig = _ensure_station(data, origin_station)
-                station_data_orig["reroute_out_times"].append(dur)
-                station_data_orig["reroute_out_count"] += 1
-                station_data_orig["_sessions_with_out"] += 1
-
-            # IN at destination station
-            station_data_dest = _ensure_station(data, dest_station)
-            station_data_dest["reroute_in_times"].append(dur)
-            station_data_dest["reroute_in_count"] += 1
-            station_data_dest["_sessions_with_in"] += 1
-
-            # Mark that this session had an OUT away from the origin group (for group-level %OUT)
-            if origin_group:
-                data["_group_sessions_with_out"][origin_group] = data["_group_sessions_with_out"].get(origin_group, 0) + 1
-
-            # Clear pending reroute
-            vs["pending_reroute"] = None
+    # A pending reroute whose destination group == origin group (returned to origin)
+    # is just discarded, so that case is ruled out before anything is unpacked.
+    start_t = vs.pending_reroute_start_t
+    if start_t is not None and vs.pending_reroute_origin_group != dest_group:
+        origin_group = vs.pending_reroute_origin_group
+        origin_station = vs.pending_reroute_origin_station
+        dur = float(now_time - start_t)
+
+        # OUT at origin station
+        if origin_station:
+            station_data_orig = _ensure_station(data, origin_station)
+            station_data_orig.reroute_out_times.append(dur)
+            station_data_orig._reroute_out_time_sum += dur
+            station_data_orig.reroute_out_count += 1
+            station_data_orig._sessions_with_out += 1
+
+        # IN at destination station
+        station_data_dest = _ensure_station(data, dest_station)
+        station_data_dest.reroute_in_times.append(dur)
+        station_data_dest._reroute_in_time_sum += dur
+        station_data_dest.reroute_in_count += 1
+        station_data_dest._sessions_with_in += 1
+
+        # Mark that this session had an OUT away from the origin group (for group-level %OUT)
+        if origin_group:
+            data["_group_sessions_with_out"][origin_group] += 1
+
+    # Clear pending reroute (finalized or discarded)
+    vs.pending_reroute_start_t = None
 
     # --- 3) Reset per-session state for this vehicle ---
-    vs["search_active"] = False
-    vs["search_start_t"] = None
-    vs["search_target_station"] = ""
-    vs["search_target_group"] = ""
-    vs["current_group"] = ""
+    vs.search_active = False
+    vs.search_start_t = None
+    vs.search_target_station = ""
+    vs.search_target_group = ""
+    vs.current_group = ""
 
 def finalize_json(data):
     """
@@ -246,79 +340,90 @@ def finalize_json(data):
     - Per-station: compute avg/p95 for search_times, reroute_in_times, and reroute_out_times.
     - Per-group: concatenate lists across stations (no averaging of averages).
     - Totals: same idea (concatenate across all stations).
-    - Round all floats to 2 decimals at the end.
+    - All floats are rounded to 2 decimals where they are computed.
     """
     per_station = data["per_station"]
 
-    # ---- Per-station aggregates ----
+    # ---- Single pass over the stations: per-station aggregates, group buckets and totals ----
+    group_stations = {}  # group_id -> [StationData, ...]
+    all_search_times = []
+    all_rin_times = []
+    all_rout_times = []  # added
+    # per-station running sums, added up with math.fsum (exactly rounded) at the end
+    search_time_sums = []
+    rin_time_sums = []
+    rout_time_sums = []
+    rin_count_total = 0
+    rout_count_total = 0
+    sessions_total = 0
+    sessions_with_in_total = 0
+
     for cs_id, station_data in per_station.items():
         # Averages / p95 for search
-        station_data["avg_search_time"] = (float(sum(station_data["search_times"]) / len(station_data["search_times"]))
-                                           if station_data["search_times"] else None)
-        station_data["p95_search_time"] = _percentile(station_data["search_times"], 95)
+        station_data.avg_search_time = _round2(station_data._search_time_sum / len(station_data.search_times)
+                                               if station_data.search_times else None)
+        station_data.p95_search_time = _round2(_percentile(station_data.search_times, 95))
 
         # Averages / p95 for reroute IN
-        station_data["avg_reroute_in_time"] = (float(sum(station_data["reroute_in_times"]) / len(station_data["reroute_in_times"]))
-                                               if station_data["reroute_in_times"] else None)
-        station_data["p95_reroute_in_time"] = _percentile(station_data["reroute_in_times"], 95)
+        station_data.avg_reroute_in_time = _round2(station_data._reroute_in_time_sum / len(station_data.reroute_in_times)
+                                                   if station_data.reroute_in_times else None)
+        station_data.p95_reroute_in_time = _round2(_percentile(station_data.reroute_in_times, 95))
 
         # Averages / p95 for reroute OUT (added)
-        station_data["avg_reroute_out_time"] = (float(sum(station_data["reroute_out_times"]) / len(station_data["reroute_out_times"]))
-                                                if station_data["reroute_out_times"] else None)
-        station_data["p95_reroute_out_time"] = _percentile(station_data["reroute_out_times"], 95)
+        station_data.avg_reroute_out_time = _round2(station_data._reroute_out_time_sum / len(station_data.reroute_out_times)
+                                                    if station_data.reroute_out_times else None)
+        station_data.p95_reroute_out_time = _round2(_percentile(station_data.reroute_out_times, 95))
 
         # Sanity: counts must match lengths of lists
-        if station_data["reroute_in_count"] != len(station_data["reroute_in_times"]):
-            station_data["reroute_in_count"] = len(station_data["reroute_in_times"])
-        if station_data["reroute_out_count"] != len(station_data["reroute_out_times"]):
-            station_data["reroute_out_count"] = len(station_data["reroute_out_times"])
+        if station_data.reroute_in_count != len(station_data.reroute_in_times):
+            station_data.reroute_in_count = len(station_data.reroute_in_times)
+        if station_data.reroute_out_count != len(station_data.reroute_out_times):
+            station_data.reroute_out_count = len(station_data.reroute_out_times)
+
+        # Bucket by group; each group column is summed over its bucket below
+        g = station_data._group_id
+        if g:
+            group_stations.setdefault(g, []).append(station_data)
+
+        # Totals (concatenate across all stations)
+        all_search_times.extend(station_data.search_times)
+        all_rin_times.extend(station_data.reroute_in_times)
+        all_rout_times.extend(station_data.reroute_out_times)  # added
+        search_time_sums.append(station_data._search_time_sum)
+        rin_time_sums.append(station_data._reroute_in_time_sum)
+        rout_time_sums.append(station_data._reroute_out_time_sum)
+        rin_count_total += station_data.reroute_in_count
+        rout_count_total += station_data.reroute_out_count
+        sessions_total += station_data.sessions
+        # station_data._sessions_with_out is origin-side, not used in totals denominator directly
+        sessions_with_in_total += station_data._sessions_with_in
 
     # ---- Per-group by concatenation ----
-    group_acc = {}  # group_id -> temp aggregation
-    for cs_id, station_data in per_station.items():
-        g = get_group_id(cs_id)
-        if not g:
-            continue
-        if g not in group_acc:
-            group_acc[g] = {
-                "sessions": 0,
-                "search_times_all": [],
-                "reroute_in_times_all": [],
-                "reroute_out_times_all": [],    # added
-                # counts
-                "reroute_in_count_total": 0,
-                "reroute_out_count_total": 0,
-                "_sessions_with_in_total": 0,   # destination-side
-                "_sessions_with_out_total": 0,  # origin-side (station perspective)
-            }
-
-        ga = group_acc[g]
-        ga["sessions"] += station_data["sessions"]
-        ga["search_times_all"].extend(station_data["search_times"])
-        ga["reroute_in_times_all"].extend(station_data["reroute_in_times"])
-        ga["reroute_out_times_all"].extend(station_data["reroute_out_times"])  # added
-        ga["reroute_in_count_total"] += station_data["reroute_in_count"]
-        ga["reroute_out_count_total"] += station_data["reroute_out_count"]
-        ga["_sessions_with_in_total"] += station_data["_sessions_with_in"]
-        ga["_sessions_with_out_total"] += station_data["_sessions_with_out"]
-
     per_group = {}
-    for g, ga in group_acc.items():
-        avg_search_time = (float(sum(ga["search_times_all"]) / len(ga["search_times_all"]))
-                           if ga["search_times_all"] else None)
-        p95_search_time = _percentile(ga["search_times_all"], 95)
+    for g, stations in group_stations.items():
+        # One concatenation per sample list (only needed for the p95)
+        search_times_all = list(chain.from_iterable(sd.search_times for sd in stations))
+        reroute_in_times_all = list(chain.from_iterable(sd.reroute_in_times for sd in stations))
+        reroute_out_times_all = list(chain.from_iterable(sd.reroute_out_times for sd in stations))  # added
+
+        sessions = sum(sd.sessions for sd in stations)
+        sessions_with_in = sum(sd._sessions_with_in for sd in stations)  # destination-side
+
+        avg_search_time = (math.fsum(sd._search_time_sum for sd in stations) / len(search_times_all)
+                           if search_times_all else None)
+        p95_search_time = _percentile(search_times_all, 95)
 
-        avg_reroute_in_time = (float(sum(ga["reroute_in_times_all"]) / len(ga["reroute_in_times_all"]))
-                               if ga["reroute_in_times_all"] else None)
-        p95_reroute_in_time = _percentile(ga["reroute_in_times_all"], 95)
+        avg_reroute_in_time = (math.fsum(sd._reroute_in_time_sum for sd in stations) / len(reroute_in_times_all)
+                               if reroute_in_times_all else None)
+        p95_reroute_in_time = _percentile(reroute_in_times_all, 95)
 
         # OUT aggregates (added)
-        avg_reroute_out_time = (float(sum(ga["reroute_out_times_all"]) / len(ga["reroute_out_times_all"]))
-                                if ga["reroute_out_times_all"] else None)
-        p95_reroute_out_time = _percentile(ga["reroute_out_times_all"], 95)
+        avg_reroute_out_time = (math.fsum(sd._reroute_out_time_sum for sd in stations) / len(reroute_out_times_all)
+                                if reroute_out_times_all else None)
+        p95_reroute_out_time = _percentile(reroute_out_times_all, 95)
 
-        # %IN uses destination sessions (ga["sessions"])
-        percent_reroute_in_sessions = (ga["_sessions_with_in_total"] / ga["sessions"]) if ga["sessions"] else None
+        # %IN uses destination sessions
+        percent_reroute_in_sessions = (sessions_with_in / sessions) if sessions else None
 
         # %OUT uses sessions that STARTED searching in this group as denominator
         group_starts = data.get("_group_session_starts", {}).get(g, 0)
@@ -326,77 +431,61 @@ def finalize_json(data):
         percent_reroute_out_sessions = (group_out_sessions / group_starts) if group_starts else None
 
         per_group[g] = {
-            "sessions": ga["sessions"],
+            "sessions": sessions,
 
-            "avg_search_time": avg_search_time,
-            "p95_search_time": p95_search_time,
+            "avg_search_time": _round2(avg_search_time),
+            "p95_search_time": _round2(p95_search_time),
 
-            "avg_reroute_in_time": avg_reroute_in_time,
-            "p95_reroute_in_time": p95_reroute_in_time,
+            "avg_reroute_in_time": _round2(avg_reroute_in_time),
+            "p95_reroute_in_time": _round2(p95_reroute_in_time),
 
-            "avg_reroute_out_time": avg_reroute_out_time,      # added
-            "p95_reroute_out_time": p95_reroute_out_time,      # added
+            "avg_reroute_out_time": _round2(avg_reroute_out_time),      # added
+            "p95_reroute_out_time": _round2(p95_reroute_out_time),      # added
 
-            "reroute_in_count_total": ga["reroute_in_count_total"],
-            "reroute_out_count_total": ga["reroute_out_count_total"],
+            "reroute_in_count_total": sum(sd.reroute_in_count for sd in stations),
+            "reroute_out_count_total": sum(sd.reroute_out_count for sd in stations),
 
-            "percent_reroute_in_sessions": percent_reroute_in_sessions,
-            "percent_reroute_out_sessions": percent_reroute_out_sessions
+            "percent_reroute_in_sessions": _round2(percent_reroute_in_sessions),
+            "percent_reroute_out_sessions": _round2(percent_reroute_out_sessions)
         }
 
-    # ---- Totals (concatenate across all stations) ----
-    all_search_times = []
-    all_rin_times = []
-    all_rout_times = []  # added
-    rin_count_total = 0
-    rout_count_total = 0
-    sessions_total = 0
-    sessions_with_in_total = 0
+    # ---- Totals ----
     # For %OUT total, use group-based denominators
     group_starts_total = sum(data.get("_group_session_starts", {}).values())
     group_out_sessions_total = sum(data.get("_group_sessions_with_out", {}).values())
 
-    for _, station_data in per_station.items():
-        all_search_times.extend(station_data["search_times"])
-        all_rin_times.extend(station_data["reroute_in_times"])
-        all_rout_times.extend(station_data["reroute_out_times"])  # added
-        rin_count_total += station_data["reroute_in_count"]
-        rout_count_total += station_data["reroute_out_count"]
-        sessions_total += station_data["sessions"]
-        sessions_with_in_total += station_data["_sessions_with_in"]
-        # station_data["_sessions_with_out"] is origin-side, not used in totals denominator directly
-
     totals = {
-        "avg_search_time": (float(sum(all_search_times)) / len(all_search_times)) if all_search_times else None,
-        "p95_search_time": _percentile(all_search_times, 95),
+        "avg_search_time": _round2((math.fsum(search_time_sums) / len(all_search_times)) if all_search_times else None),
+        "p95_search_time": _round2(_percentile(all_search_times, 95)),
 
-        "avg_reroute_in_time": (float(sum(all_rin_times)) / len(all_rin_times)) if all_rin_times else None,   # added
-        "p95_reroute_in_time": _percentile(all_rin_times, 95),                                                # added
+        "avg_reroute_in_time": _round2((math.fsum(rin_time_sums) / len(all_rin_times)) if all_rin_times else None),  # added
+        "p95_reroute_in_time": _round2(_percentile(all_rin_times, 95)),  # added
 
-        "avg_reroute_out_time": (float(sum(all_rout_times)) / len(all_rout_times)) if all_rout_times else None,  # added
-        "p95_reroute_out_time": _percentile(all_rout_times, 95),                                                  # added
+        "avg_reroute_out_time": _round2((math.fsum(rout_time_sums) / len(all_rout_times)) if all_rout_times else None),  # added
+        "p95_reroute_out_time": _round2(_percentile(all_rout_times, 95)),  # added
 
         "reroute_in_count_total": rin_count_total,
         "reroute_out_count_total": rout_count_total,
 
-        "percent_reroute_in_sessions_total": (sessions_with_in_total / sessions_total) if sessions_total else None,
-        "percent_reroute_out_sessions_total": (group_out_sessions_total / group_starts_total) if group_starts_total else None
+        "percent_reroute_in_sessions_total": _round2((sessions_with_in_total / sessions_total) if sessions_total else None),
+        "percent_reroute_out_sessions_total": _round2((group_out_sessions_total / group_starts_total) if group_starts_total else None)
     }
 
     # Build final dict in your exact structure (strip internals)
     final_json = {
-        "per_station": {cs: {k: v for k, v in station_data.items() if not k.startswith("_")}
-                        for cs, station_data in per_station.items()},
+        "per_station": {cs: station_data.to_dict() for cs, station_data in per_station.items()},
         "per_group": per_group,
         "totals": totals
     }
 
-    # Round everything to 2 decimals
-    _round_floats_inplace(final_json, ndigits=2)
     return final_json
 
 def dump_json(data_obj, path):
-    # Defensive rounding at write time (in case caller didn't call finalize_json)
-    _round_floats_inplace(data_obj, ndigits=2)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data_obj, f, ensure_ascii=False, indent=2)
+    # data_obj comes from finalize_json(), whose floats are already rounded
+    if _orjson is not None:
+        with open(path, "wb") as f:
+            f.write(_orjson.dumps(data_obj, option=_orjson.OPT_INDENT_2))
+    else:
+        # Encode in one go: json.dump() would issue one write() per token
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(data_obj, ensure_ascii=False, indent=2))
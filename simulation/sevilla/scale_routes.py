@@ -1,10 +1,17 @@
 #!/usr/bin/env python3
 import sys
+import numpy as np
 import pandas as pd
 
+try:
+    import pyarrow  # noqa: F401  (enables the multithreaded CSV reader)
+    _CSV_ENGINE = "pyarrow"
+except ImportError:
+    _CSV_ENGINE = "c"
+
 def main(input_path, output_path, scale_factor):
     # Read CSV file (first row is the header)
-    df = pd.read_csv(input_path)
+    df = pd.read_csv(input_path, engine=_CSV_ENGINE)
 
     # Scale all columns except the first one (label, e.g. "RUTAS")
     # and the last one (total), using the given scale_factor
@@ -14,12 +21,14 @@ def main(input_path, output_path, scale_factor):
     # All numeric data columns, excluding first (index 0) and last (index -1)
     data_cols = df.columns[1:-1]
 
-    # Apply scaling and round to nearest integer
-    df.loc[:, data_cols] = (df.loc[:, data_cols] * scale_factor).round().astype(int)
+    # Apply scaling and round to nearest integer, in one pass over the
+    # underlying float array (np.rint rounds half to even, like DataFrame.round)
+    scaled = np.rint(df[data_cols].to_numpy(dtype=np.float64) * scale_factor).astype(np.int64)
+    df[data_cols] = scaled
 
     # Recalculate the last column as the row-wise sum of all scaled data columns
     total_col = df.columns[-1]
-    df[total_col] = df.loc[:, data_cols].sum(axis=1)
+    df[total_col] = scaled.sum(axis=1)
 
     # Save the resulting DataFrame to CSV without index
     df.to_csv(output_path, index=False)
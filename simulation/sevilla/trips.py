@@ -3,9 +3,10 @@ Vehicle route generation module for SUMO traffic simulations.
 This module generates vehicles routes based on input data
 """
 
-import random
+import heapq
 import os
 import json
+import numpy as np
 import pandas as pd
 import sys
 if 'SUMO_HOME' in os.environ:
@@ -13,17 +14,21 @@ if 'SUMO_HOME' in os.environ:
 import sumolib  # noqa
 from sumolib.net.edge import Edge
 from sumolib.net import Net
-from typing import List, Set, Tuple
+from typing import Dict, List, Set, Tuple
 from collections import defaultdict
-from xml.etree.ElementTree import Element, SubElement, tostring
-from xml.dom import minidom
+from functools import lru_cache
+from xml.sax.saxutils import quoteattr
 from mpi4py import MPI
 import argparse
 
+_RNG = np.random.default_rng()
+
 class Vehicle:
     """ 
     Represents a vehicle with its route an departure time
     """
+    __slots__ = ("vehicle_id", "depart_time", "edges")
+
     def __init__(self, id, depart_time, edges):
         """  
         Initialize a Vehicle instance
@@ -31,11 +36,11 @@ class Vehicle:
         Args:
             route_id: unique identifier for the vehicle
             depart_time: Simulation time when the vehicle departs (seconds)
-            edges: List of edge IDs that form the vehicle's route
+            edges: Sequence (tuple) of edge IDs that form the vehicle's route
         """
         self.vehicle_id = id
         self.depart_time = depart_time 
-        self.edges = edges 
+        self.edges = tuple(edges)
     
     
     def __repr__(self):
@@ -44,17 +49,20 @@ class Vehicle:
 
 
 class Route:
+    __slots__ = ("route_id", "total_vehicles", "edges", "edge_objs", "processed_vehicles")
+
     def __init__(self, route_id, total_vehicles, edges):
         """ 
         Initialize a Route instance
         Args:
             route_id: unique identifier for the route
             total_vehicles: number of vehicles assigned to this route
-            edges: list of edges ids that form the route 
+            edges: sequence (tuple) of edge ids that form the route
         """
         self.route_id = route_id
         self.total_vehicles = total_vehicles
-        self.edges = edges
+        self.edges = tuple(edges)
+        self.edge_objs = () # Edge objects for edges, bound by the process that uses the route
         self.processed_vehicles = [] # List of vehicle IDs processed for this route
     
     def add_vehicles(self, id_vh_list):
@@ -91,31 +99,39 @@ def load_route_data(route_vehicles_file_path, route_edges_file_path)-> List[Rout
     with open(route_edges_file_path, "r") as f:
         edges_data = json.load(f)
 
+    # Parse each route's edges once (shared by every hour) and read all the
+    # counts as one array instead of a Series lookup per (hour, route) cell
+    route_numbers = df["RUTAS"].astype(int).to_numpy()
+    counts = df[hours].to_numpy()
+    parsed_edges = {
+        route: tuple(sys.intern(edge.strip()) for edge in edges_data.get(f'RUTA_{route}', '').split(',') if edge.strip())
+        for route in route_numbers
+    }
+
     res = {}
-    for hour in hours:
-        hour_routes = []
-        for i, route in enumerate(df["RUTAS"]):
-            # Create route ID by combining route number and hour
-            id_route = f"{int(route)}_{hour}"
-            n_vehicles = df[hour][i]
-
-            # Get edges for this route from JSON data
-            route_edges = []
-            json_key = f'RUTA_{int(route)}'
-            if json_key in edges_data:
-                edge_str = edges_data[json_key]
-                route_edges = [edge.strip() for edge in edge_str.split(',') if edge.strip()]
-
-            # Create Route object and add to hour's routes
-            new_route = Route(id_route, n_vehicles, route_edges)
-            hour_routes.append(new_route)
-        
+    for j, hour in enumerate(hours):
+        # Create route ID by combining route number and hour
+        hour_routes = [Route(f"{route}_{hour}", int(counts[i, j]), parsed_edges[route])
+                       for i, route in enumerate(route_numbers)]
+
         # Calculate total vehicles for this hour
-        total_vh = df[hour].sum()
-        res[hour] = (hour_routes, total_vh)
+        res[hour] = (hour_routes, int(counts[:, j].sum()))
     return res
 
-def find_routes_by_edge(routes, current_id, vehicles, update_routes:dict):
+def build_edge_route_index(routes) -> dict:
+    """
+    Build an inverted index edge ID -> set of IDs of the routes that contain that edge.
+
+    Args:
+        routes: List of Route objects
+    """
+    edge_to_routes = defaultdict(set)
+    for route in routes:
+        for edge_id in route.edges:
+            edge_to_routes[edge_id].add(route.route_id)
+    return edge_to_routes
+
+def find_routes_by_edge(routes, current_id, vehicles, update_routes:dict, edge_to_routes=None):
 
     """
     Find routes that share edges with the given vehicles.
@@ -125,22 +141,170 @@ def find_routes_by_edge(routes, current_id, vehicles, update_routes:dict):
         current_id: ID of the current route being processed
         vehicles: List of Vehicle objects to check
         update_routes: Dictionary to accumulate route updates
+        edge_to_routes: Index from build_edge_route_index(routes) (built here if not given)
         
     Returns:
         Updated dictionary mapping route IDs to lists of vehicle IDs
     """
-    
+    if edge_to_routes is None:
+        edge_to_routes = build_edge_route_index(routes)
+
     for vh in vehicles:
-        for route in routes:
-            if route.route_id != current_id: # Skip the current route
-                if any(edge_id in vh.edges for edge_id in route.edges):                     
-                    # Add vehicle to the update list for this route
-                    if update_routes.get(route.route_id):
-                        update_routes[route.route_id].append(vh.vehicle_id) 
-                    else:
-                        update_routes[route.route_id] = [vh.vehicle_id]
+        # Routes sharing at least one edge with the vehicle, from the index
+        hit = set()
+        for edge_id in vh.edges:
+            route_ids = edge_to_routes.get(edge_id)
+            if route_ids:
+                hit |= route_ids
+        hit.discard(current_id) # Skip the current route
+        for route_id in hit:
+            # Add vehicle to the update list for this route
+            update_routes.setdefault(route_id, []).append(vh.vehicle_id)
     return update_routes
 
+# Bumped every time route edges are penalized, so paths cached before that are not reused
+_penalty_epoch = 0
+
+# Consecutive failed path attempts after which a source edge is no longer sampled for a route
+_MAX_SOURCE_FAILURES = 3
+
+# Structurally identical paths (same route found again in a later epoch) share one tuple
+_PATH_INTERN: Dict[tuple, tuple] = {}
+
+def intern_path(path: tuple) -> tuple:
+    """Return the shared instance of an edge-ID path tuple."""
+    return _PATH_INTERN.setdefault(path, path)
+
+@lru_cache(maxsize=None)
+def _edge_ids(net: Net) -> Dict[Edge, str]:
+    """
+    Edge -> edge ID for the whole network (IDs don't change with the penalties).
+    IDs are interned, so paths and routes naming the same edge share one string
+    (which pickle then writes once per message).
+    """
+    return {edge: sys.intern(edge.getID()) for edge in net.getEdges()}
+
+@lru_cache(maxsize=None)
+def _edge_components(net: Net) -> Dict[Edge, int]:
+    """
+    Strongly connected component index of every edge (iterative Tarjan). Every edge
+    of a component reaches exactly the same edges, and the penalties only change
+    lengths, so this holds for the whole run.
+    """
+    index = {}
+    low = {}
+    comp = {}
+    stack = []
+    on_stack = set()
+    n_comp = 0
+    for root in net.getEdges():
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(root.getOutgoing()))]
+        while work:
+            edge, successors = work[-1]
+            for succ in successors:
+                if succ not in index:
+                    index[succ] = low[succ] = len(index)
+                    stack.append(succ)
+                    on_stack.add(succ)
+                    work.append((succ, iter(succ.getOutgoing())))
+                    break
+                if succ in on_stack:
+                    low[edge] = min(low[edge], index[succ])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[edge])
+                if low[edge] == index[edge]:
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        comp[member] = n_comp
+                        if member is edge:
+                            break
+                    n_comp += 1
+    return comp
+
+def _reachable_targets(source: Edge, target_edges) -> tuple:
+    """Targets that can be reached from source (i.e. for which a path exists)."""
+    seen = {source}
+    pending = [source]
+    while pending:
+        for succ in pending.pop().getOutgoing():
+            if succ not in seen:
+                seen.add(succ)
+                pending.append(succ)
+    return tuple(edge for edge in target_edges if edge in seen)
+
+class _ShortestPathSearch:
+    """
+    Dijkstra from one source edge, for one penalty epoch. It follows sumolib's
+    getShortestPath (edge lengths as costs, ties broken by edge ID), so the paths
+    read from it are the ones getShortestPath returns. The search only runs until
+    the requested target is settled and resumes from there for the next target,
+    since a settled edge's predecessor never changes.
+    """
+    __slots__ = ("dist", "settled", "queue")
+
+    def __init__(self, source: Edge):
+        self.dist = {source: (0., None)}
+        self.settled = {} # edge -> predecessor edge (None for the source)
+        self.queue = [(0., source, None)]
+
+    def predecessors(self, target: Edge) -> Dict[Edge, Edge]:
+        """Settle edges until target is (or the reachable edges are exhausted)."""
+        dist = self.dist
+        settled = self.settled
+        queue = self.queue
+        while target not in settled and queue:
+            cost, e1, _ = heapq.heappop(queue)
+            if e1 in settled:
+                continue
+            settled[e1] = dist[e1][1]
+            for e2 in e1.getOutgoing():
+                if e2 not in settled:
+                    new_cost = cost + e2.getLength()
+                    if e2 not in dist or new_cost < dist[e2][0]:
+                        dist[e2] = (new_cost, e1)
+                        heapq.heappush(queue, (new_cost, e2, e1))
+        return settled
+
+@lru_cache(maxsize=64)
+def _shortest_path_search(net: Net, source_edge_id, epoch) -> _ShortestPathSearch:
+    """The (resumable) search from one source edge for the given penalty epoch."""
+    return _ShortestPathSearch(net.getEdge(source_edge_id))
+
+@lru_cache(maxsize=200_000)
+def _cached_path(net: Net, source_edge_id, target_edge_id, epoch) -> Tuple[str, ...]:
+    """
+    Shortest path between two edges as a tuple of edge IDs (None if there is none),
+    memoized per (source, target, penalty epoch).
+    """
+    if net.hasInternal:
+        # Internal connectors add to the costs; leave those to sumolib
+        shortest_path = net.getShortestPath(net.getEdge(source_edge_id), net.getEdge(target_edge_id))[0]
+        if shortest_path is None:
+            return None
+        id_of = _edge_ids(net)
+        return intern_path(tuple(id_of[edge] for edge in shortest_path))
+
+    edge = net.getEdge(target_edge_id)
+    preds = _shortest_path_search(net, source_edge_id, epoch).predecessors(edge)
+    if edge not in preds:
+        return None
+    id_of = _edge_ids(net)
+    path = []
+    while edge is not None:
+        path.append(id_of[edge])
+        edge = preds[edge]
+    path.reverse()
+    return intern_path(tuple(path))
+
 def generate_vehicles_for_hour(start_time, net: Net, target_edges, routes:List[Route], total_vh,
                               start_id: int) -> List[Vehicle]:
 
@@ -163,10 +327,23 @@ def generate_vehicles_for_hour(start_time, net: Net, target_edges, routes:List[R
     depart_rate = 3600 / total_vh
     depart_time_list = [start_time + round(i* float(depart_rate), 2) 
                        for i in range(int(total_vh))]
+    # Shuffled once: taking from the end is a uniform random pick that is O(1) to remove
+    depart_time_list = [depart_time_list[i] for i in _RNG.permutation(len(depart_time_list)).tolist()]
     
+    global _penalty_epoch
+
     global_vehicles = []
     current_id = start_id
     update_routes = {}
+    edge_to_routes = build_edge_route_index(routes)
+    id_of = _edge_ids(net)
+    # Reachable targets per source component, so no search is spent on a pair with no path
+    components = _edge_components(net)
+    targets_by_component = {}
+    for route in routes:
+        route.edge_objs = tuple(net.getEdge(edge_id) for edge_id in route.edges if net.hasEdge(edge_id))
+    # Original length of every lane penalized during this hour
+    original_lengths = {}
     
     for route in routes:
         local_vehicles = []
@@ -177,52 +354,119 @@ def generate_vehicles_for_hour(start_time, net: Net, target_edges, routes:List[R
         if route_id in update_routes:
             route.add_vehicles(update_routes[route_id])
 
+        # Candidate sources: route edges in the network with at least one reachable target
+        live_sources = []
+        for edge in route.edge_objs:
+            component = components[edge]
+            if component not in targets_by_component:
+                targets_by_component[component] = _reachable_targets(edge, target_edges)
+            if targets_by_component[component]:
+                live_sources.append(edge)
+        # Consecutive failures per source; a source is dropped after _MAX_SOURCE_FAILURES
+        failures = defaultdict(int)
+
+        # Source/target draws are made in batches (sized for the vehicles still
+        # missing plus retries) and consumed through a cursor
+        source_draws = target_draws = ()
+        k = 0
+
         # Generate routes 
         while route.processed():                   
-            select_depart = random.choice(depart_time_list)
-            select_source_edge_id = random.choice(route.edges)
-            select_target_edge = random.choice(target_edges)
-            current_edge = net.getEdge(select_source_edge_id)
+            if not live_sources:
+                print(f"Route {route_id}: no usable source edges, "
+                      f"{route.total_vehicles - len(route.processed_vehicles)} vehicles not generated")
+                break
+            if k == len(source_draws):
+                n_draws = 3 * (route.total_vehicles - len(route.processed_vehicles)) + 8
+                source_draws = _RNG.integers(len(live_sources), size=n_draws).tolist()
+                # Raw integers, reduced modulo the size of the source's reachable set
+                target_draws = _RNG.integers(1 << 62, size=n_draws).tolist()
+                k = 0
+            select_depart = depart_time_list[-1]
+            select_source_edge = live_sources[source_draws[k]]
+            target_draw = target_draws[k]
+            k += 1
 
             try:
-                shortest_path = net.getShortestPath(current_edge, select_target_edge)[0]
-                if shortest_path is None:
-                    continue
-
-                path_edges_id = [edge.getID() for edge in shortest_path]
-                new_vh = Vehicle(current_id, select_depart, path_edges_id)
-                
-                route.add_vehicles([new_vh])
-                local_vehicles.append(new_vh)
-                current_id += 1
-                depart_time_list.remove(select_depart)
-
+                reachable_targets = targets_by_component[components[select_source_edge]]
+                select_target_edge = reachable_targets[target_draw % len(reachable_targets)]
+                path_edges_id = _cached_path(net, id_of[select_source_edge], id_of[select_target_edge], _penalty_epoch)
             except Exception as e:
                 print(f"Error generating path for route {route_id}: {e}")
+                path_edges_id = None
+
+            if path_edges_id is None:
+                failures[select_source_edge] += 1
+                if failures[select_source_edge] >= _MAX_SOURCE_FAILURES:
+                    live_sources.remove(select_source_edge)
+                    k = len(source_draws) # Pending draws index the old pool
                 continue
+            failures[select_source_edge] = 0
+
+            new_vh = Vehicle(current_id, select_depart, path_edges_id)
+            
+            route.add_vehicles([new_vh])
+            local_vehicles.append(new_vh)
+            current_id += 1
+            depart_time_list.pop()
         print(f"{route.route_id}: generados {len(local_vehicles)} contenidos {len(route.processed_vehicles)}")
 
         # Penalize edges in this route to encourage diversity in future routes
-        for edge_id in route.edges:
-            net.getEdge(edge_id)._lanes[0]._length = 999999
+        for edge in route.edge_objs:
+            lane = edge._lanes[0]
+            original_lengths.setdefault(lane, lane._length)
+            lane._length = 999999
+        _penalty_epoch += 1
         
         # Find routes that share edges with the generated vehicles
-        update_routes = find_routes_by_edge(routes, route_id, local_vehicles, update_routes)
+        update_routes = find_routes_by_edge(routes, route_id, local_vehicles, update_routes, edge_to_routes)
         
         global_vehicles.extend(local_vehicles)
     
+    # Undo this hour's penalties so they don't bias the next hour's paths
+    for lane, length in original_lengths.items():
+        lane._length = length
+    _penalty_epoch += 1
+    
     return global_vehicles, current_id
 
 
-def create_route_file(vehicles:List[Vehicle], filename="generated_routes.rou.xml", electric_percentage = 0.0):
+def _xml_attrs(attrs: dict) -> str:
+    """Format a dict as XML attributes (quoted and escaped), in insertion order."""
+    return " ".join(f'{key}={quoteattr(value)}' for key, value in attrs.items())
+
+def _departure_order(depart_times) -> List[int]:
+    """Indices that sort depart_times (stable, so ties keep their order)."""
+    return np.argsort(np.asarray(depart_times, dtype=np.float64), kind="stable").tolist()
+
+def write_vehicle_fragment(vehicle_ids, depart_times, edges_strs, path):
+    """
+    Write vehicles (given as parallel columns) sorted by departure time as
+    'id<TAB>depart<TAB>edges' lines, so a process can hand its share of the
+    output over without sending the objects.
+    """
+    with open(path, 'w') as f:
+        for i in _departure_order(depart_times):
+            f.write(f'{vehicle_ids[i]}\t{depart_times[i]!r}\t{edges_strs[i]}\n')
+
+def read_vehicle_fragment(path):
+    """Yield the (vehicle_id, depart_time, edges_str) rows of a fragment, in file order."""
+    with open(path) as f:
+        for line in f:
+            yield tuple(line.rstrip('\n').split('\t'))
+
+def create_route_file(vehicles:List[Vehicle], filename="generated_routes.rou.xml", electric_percentage = 0.0,
+                      n_vehicles=None):
     """
     Create a SUMO route file from a list of Vehicle objects.
     
     Args:
         vehicles: List of Vehicle objects to include in the file
         filename: Name of the output file
+        n_vehicles: If given, vehicles is instead an iterable of that many
+            (vehicle_id, depart_time, edges_str) rows already sorted by departure
+            time (e.g. merged fragments), written as it comes
     """
-    root = Element('routes')
     print(electric_percentage)
     vtype_regular=  {'id': 'type1', 
          'minGap': '1.5',
@@ -250,9 +494,7 @@ def create_route_file(vehicles:List[Vehicle], filename="generated_routes.rou.xml
          'device.rerouting.mode': '8',
          'device.rerouting.period': '120'     
          }
-    SubElement(root, 'vType', vtype_regular)
-
-    vtype_electric = Element('vType', {
+    vtype_electric = {
         'id': 'EV',
         'minGap': '2.5',
         'maxSpeed': '41.66',
@@ -261,7 +503,7 @@ def create_route_file(vehicles:List[Vehicle], filename="generated_routes.rou.xml
         'accel': '1',
         'decel': '1',
         'sigma': '0'
-    })
+    }
 
     params = [
         ('has.battery.device', 'true'),
@@ -289,36 +531,38 @@ def create_route_file(vehicles:List[Vehicle], filename="generated_routes.rou.xml
         ('mass', '1615')
     ]
 
-    for key, value in params:
-        param_elem = SubElement(vtype_electric, 'param', {'key': key, 'value': value})
-
-    root.append(vtype_electric)
-
-    vehicles_sorted = sorted(vehicles, key=lambda x: x.depart_time)
+    if n_vehicles is None:
+        n_vehicles = len(vehicles)
+        rows = ((vehicles[i].vehicle_id, vehicles[i].depart_time, " ".join(vehicles[i].edges))
+                for i in _departure_order([vehicle.depart_time for vehicle in vehicles]))
+    else:
+        rows = vehicles
 
-    electric_vehicles = set()
+    # EVs are picked by position in departure order
+    electric_mask = np.zeros(n_vehicles, dtype=bool)
     if electric_percentage > 0:
-        num_electric = int(len(vehicles_sorted) * electric_percentage)
-        electric_vehicles = set(random.sample(range(len(vehicles_sorted)), num_electric))
-
-    for vehicle in vehicles_sorted:
-        edges_str = " ".join(vehicle.edges)
-        vehicle_type = "EV" if vehicle.vehicle_id in electric_vehicles else "type1"
+        num_electric = int(n_vehicles * electric_percentage)
+        electric_mask[_RNG.choice(n_vehicles, num_electric, replace=False)] = True
 
-        veh_elem = SubElement(root, 'vehicle', {
-        'id': str(vehicle.vehicle_id),
-        'depart': str(vehicle.depart_time),
-        'type': vehicle_type,
-        })
+    # Stream the file line by line (same layout as minidom's toprettyxml with
+    # 4-space indent) instead of building and re-parsing a DOM of every vehicle
+    with open(filename, 'w') as f:
+        f.write('<?xml version="1.0" ?>\n<routes>\n')
+        f.write(f'    <vType {_xml_attrs(vtype_regular)}/>\n')
+        f.write(f'    <vType {_xml_attrs(vtype_electric)}>\n')
+        for key, value in params:
+            f.write(f'        <param {_xml_attrs({"key": key, "value": value})}/>\n')
+        f.write('    </vType>\n')
 
-        SubElement(veh_elem, "route", {"edges": edges_str})
+        for (vehicle_id, depart_time, edges_str), is_electric in zip(rows, electric_mask.tolist()):
+            vehicle_type = "EV" if is_electric else "type1"
 
-    xml_str = minidom.parseString(tostring(root)).toprettyxml(indent="    ")
+            f.write(f'    <vehicle id="{vehicle_id}" depart="{depart_time}" type="{vehicle_type}">\n'
+                    f'        <route edges={quoteattr(edges_str)}/>\n'
+                    '    </vehicle>\n')
 
-    with open(filename, 'w') as f:
+        f.write('</routes>\n')
 
-        f.write(xml_str)
-    
     print(f"Archivo {filename} creado exitosamente")
 
 def parse_arguments():
@@ -377,18 +621,19 @@ if __name__ == "__main__":
             process_hours = hours[start_idx:end_idx]  
             distribution.append(process_hours)
             start_idx = end_idx
+
+        # Each process only receives the routes of its own hours
+        per_rank_data = [{hour: hour_route_data[hour] for hour in process_hours}
+                         for process_hours in distribution]
     else:
-        hour_route_data = None
-        distribution = None
+        per_rank_data = None
 
-    hour_route_data = comm.bcast(hour_route_data, root=0)
-    local_hours = comm.scatter(distribution if rank == 0 else None, root=0)
-    all_vehicles = []
+    local_hour_data = comm.scatter(per_rank_data, root=0)
+    # Only what the route file needs is kept per generated vehicle, as parallel columns
+    vehicle_ids, depart_times, edges_strs = [], [], []
     current_id = 0
         
-    for i, hour in enumerate(local_hours):
-        hour_data = hour_route_data[hour]
-        routes, total_vh = hour_data
+    for i, (hour, (routes, total_vh)) in enumerate(local_hour_data.items()):
         start_time = 3600*i
         vehicles, current_id = generate_vehicles_for_hour(start_time,
             net, target_edges, routes, total_vh, current_id)
@@ -396,16 +641,27 @@ if __name__ == "__main__":
         #vehicles, current_id = generate_vehicles_for_hour(start_time,
         #    net, target_edges, routes, total_vh, current_id)
         
-        all_vehicles.extend(vehicles)
+        for vehicle in vehicles:
+            vehicle_ids.append(vehicle.vehicle_id)
+            depart_times.append(vehicle.depart_time)
+            edges_strs.append(" ".join(vehicle.edges))
         print(f"vehiculos generados en {hour}: {len(vehicles)}")
 
-    gathered_vehicles = comm.gather(all_vehicles, root=0)
+    # Every process writes its own vehicles, sorted, next to the output file; only
+    # the counts travel to rank 0, which merges the fragments into the route file
+    fragment_path = f"{args.output_file}.{rank}.part"
+    write_vehicle_fragment(vehicle_ids, depart_times, edges_strs, fragment_path)
+    gathered_counts = comm.gather(len(vehicle_ids), root=0)
 
     if rank == 0:
-        final_vehicles = []
-        for vehicle_list in gathered_vehicles:
-            final_vehicles.extend(vehicle_list)
-        create_route_file(final_vehicles, args.output_file, args.electric_percentage)
+        fragment_paths = [f"{args.output_file}.{i}.part" for i in range(size)]
+        n_vehicles = sum(gathered_counts)
+        # heapq.merge is stable, so ties keep the rank order of the former gather + sort
+        merged = heapq.merge(*(read_vehicle_fragment(path) for path in fragment_paths),
+                             key=lambda row: float(row[1]))
+        create_route_file(merged, args.output_file, args.electric_percentage, n_vehicles)
+        for path in fragment_paths:
+            os.remove(path)
 
         
-        print(f"Total vehicles generated: {len(final_vehicles)}")
+        print(f"Total vehicles generated: {n_vehicles}")
@@ -36,6 +36,17 @@ import argparse
 import json
 import xml.etree.ElementTree as ET
 
+try:  # optional: libxml2-backed parser/serializer for the route and connection files
+    from lxml import etree as _lxml_etree
+except ImportError:
+    _lxml_etree = None
+
+def _parse_xml(path):
+    """Parse an XML file with lxml when available (same tree API as ElementTree)."""
+    if _lxml_etree is not None:
+        return _lxml_etree.parse(path, _lxml_etree.XMLParser(huge_tree=True))
+    return ET.parse(path)
+
 def expand_grid(flat_config):
     """
     Expands a flat configuration dictionary into all combinations of its list values.
@@ -104,7 +115,7 @@ def folder_setup(param_dict, file_names, port=''):
     return folder_path
 
 def add_charging_stations():    
-    edge_ids = obtain_edge_ids_no_roundabouts()   
+    edge_ids = set(obtain_edge_ids_no_roundabouts())
     for cs in CS_LIST:
         #edge_id = edge_ids[cs]
         edge_id = cs
@@ -182,27 +193,27 @@ def replace_routes():
     """
     
     # Parse the XML file
-    tree = ET.parse(ROUTES_FILE)
+    tree = _parse_xml(ROUTES_FILE)
     root = tree.getroot()
 
     # --- 1. Replace edges inside vehicles ---
-    for vehicle in root.findall('vehicle'):
+    for vehicle in root.iterfind('vehicle'):
         route = vehicle.find('route')
         if route is not None:
             edges = route.attrib.get('edges', "")
             edge_ids = edges.split()
             modified_edges = [
-                f"first_{eid} second_{eid}" if eid in CS_LIST else eid
+                f"first_{eid} second_{eid}" if eid in CS_LIST_SET else eid
                 for eid in edge_ids
             ]
             route.attrib['edges'] = " ".join(modified_edges)
 
     # --- 2. Replace edges in routes defined directly under root ---
-    for route in root.findall('route'):
+    for route in root.iterfind('route'):
         edges = route.attrib.get('edges', "")
         edge_ids = edges.split()
         modified_edges = [
-            f"first_{eid} second_{eid}" if eid in CS_LIST else eid
+            f"first_{eid} second_{eid}" if eid in CS_LIST_SET else eid
             for eid in edge_ids
         ]
         route.attrib['edges'] = " ".join(modified_edges)
@@ -215,11 +226,11 @@ def replace_routes2():
     with 'first_<id> second_<id>', while maintaining the original order of edges."""
     
     # Parse the XML file
-    tree = ET.parse(ROUTES_FILE)
+    tree = _parse_xml(ROUTES_FILE)
     root = tree.getroot()
 
     # Iterate over all vehicle elements
-    for vehicle in root.findall('vehicle'):
+    for vehicle in root.iterfind('vehicle'):
         # Find the route element within the vehicle
         route = vehicle.find('route')
         if route is not None:
@@ -235,7 +246,7 @@ def replace_routes2():
             # Iterate over each edge ID in the original order
             for edge_id in edge_ids:
                 # Check if the edge ID is in the CS_LIST
-                if edge_id in CS_LIST:
+                if edge_id in CS_LIST_SET:
                     # Replace with the desired format 'first_<id> second_<id>'
                     modified_edges.append(f"first_{edge_id} second_{edge_id}")
                 else:
@@ -250,18 +261,18 @@ def replace_routes2():
 
 def fix_connections(file):
     """Fix connections file by renaming edges in CS_LIST"""
-    tree = ET.parse(file)
+    tree = _parse_xml(file)
     root = tree.getroot()
 
-    for conn in root.findall("connection"):
+    for conn in root.iterfind("connection"):
         # Check 'from'
         from_edge = conn.get("from")
-        if from_edge in CS_LIST:
+        if from_edge in CS_LIST_SET:
             conn.set("from", f"second_{from_edge}")
 
         # Check 'to'
         to_edge = conn.get("to")
-        if to_edge in CS_LIST:
+        if to_edge in CS_LIST_SET:
             conn.set("to", f"first_{to_edge}")
 
     # Save back to the same file
@@ -1122,8 +1133,8 @@ def run_simulation(port):
     
     # Initialize the simulation information
     simulationData = emissions.get_initial_simulation_information(saveBuildings=False, saveVegetation=False, networkFilePath=NETWORK_FILE)
-    reroutingData = reroutings.new_rerouting_data()
-    vehicleEmissions = {}
+    reroutingData = reroutings.new_rerouting_data(traci.chargingstation.getIDList())
+    vehicleEmissions = emissions.new_vehicle_emissions()
     vehList = []
 
     # Execute the simulation loop
@@ -1131,7 +1142,8 @@ def run_simulation(port):
         traci.simulationStep()
         sim_time = traci.simulation.getTime()          
 
-        # --- Per-vehicle tick update (time-only logic) ---
+        # --- Per-vehicle tick update (time-only logic), fed to reroutings as one batch ---
+        rerouting_ticks = []
         for veh in traci.vehicle.getIDList():
             vtype = traci.vehicle.getTypeID(veh)
             if vtype == "EV":              
@@ -1142,7 +1154,7 @@ def run_simulation(port):
                     # Get the current s and b values
                     csId_stationfinder = traci.vehicle.getParameter(veh, "device.stationfinder.chargingStation")  # 's'
                     csId_battery = traci.vehicle.getParameter(veh, "device.battery.chargingStationId")  # 'b'
-                    reroutings.tick_update_vehicle(reroutingData,veh,csId_stationfinder,csId_battery,sim_time)
+                    rerouting_ticks.append((veh, csId_stationfinder, csId_battery))
                     # If the EV is looking for a station, teleporting is disabled
                     # if csId_stationfinder != "":
                     #     wt=traci.vehicle.getWaitingTime(veh)
@@ -1154,6 +1166,7 @@ def run_simulation(port):
                     #         # Move the vehicle slightly to reset waiting time
                     #         #print(f"Moving vehicle {veh} slightly to reset waiting time with angle {angle}")
                     #         traci.vehicle.moveToXY(veh, "", 0, xb, yb, angle=angle, keepRoute=1)
+        reroutings.tick_update_vehicles(reroutingData, rerouting_ticks, sim_time)
 
         # Vehicles which are starting to charge        
         for veh in traci.simulation.getStopStartingVehiclesIDList():
@@ -1175,7 +1188,7 @@ def run_simulation(port):
         #calculateAliquotPowerAdjustments(vehList)
         #setChargingStationPowers(vehList)
         # Get vehicle emissions at this step
-        # vehicleEmissions[int(traci.simulation.getTime())] = emissions.get_instant_vehicle_emissions(simulationData)
+        # emissions.get_instant_vehicle_emissions(simulationData, vehicleEmissions)
 
     # Get the final simulation information
     # emissions.get_final_simulation_information(simulationData, vehicleEmissions)
@@ -1317,7 +1330,7 @@ def run(config, port=8816):
     # netconvert --sumo-net-file network.net.xml --plain-output-prefix network
     # Set up paths and files based on the configuration
     global FOLDER, WORKING_FOLDER, NODES_FILE, EDGES_FILE, ADDITIONAL_FILE
-    global CON_FILE, TLL_FILE, NETWORK_FILE, CS_LIST, CS_SIZE, CS_POWER, ROUTES_FILE
+    global CON_FILE, TLL_FILE, NETWORK_FILE, CS_LIST, CS_LIST_SET, CS_SIZE, CS_POWER, ROUTES_FILE
     global SUMO_BINARY, CONFIG_FILE, POLY_FILE
 
     FOLDER = config["FOLDER"]
@@ -1331,6 +1344,7 @@ def run(config, port=8816):
 
     # Add charging stations
     CS_LIST = config["CS_LIST"]
+    CS_LIST_SET = frozenset(CS_LIST) # For membership tests; CS_LIST keeps the order
     CS_SIZE = config["CS_SIZE"]
     CS_POWER = config["CS_POWER"]
     CON_FILE = WORKING_FOLDER + config["CON_FILE"]